@@ -10,7 +10,13 @@ server_unavailable = False
 
 app = Flask("CJA API")
 auto = Autodoc(app)
-CORS(app, resources={r"/api/*": {"origins": "*"}}, vary_header=False)
+CORS(
+    app,
+    resources={r"/api/*": {"origins": "*"}},
+    vary_header=False,
+    # The effective window of align= requests, see app.utils.window_headers
+    expose_headers=["X-Window-From", "X-Window-To"],
+)
 
 db = Persistence().create_schema()
 
@@ -0,0 +1,39 @@
+"""In-process cache of the customer orderings behind pagination cursors.
+
+A cursor carries the window it pages through and its offset, so a worker that
+no longer holds the ordering can rebuild it instead of failing.
+"""
+from .cache_utils import TTLCache
+import base64
+import json
+import os
+import uuid
+
+CURSOR_CACHE_TTL = float(os.getenv("CURSOR_CACHE_TTL", 600))
+CURSOR_CACHE_SIZE = int(os.getenv("CURSOR_CACHE_SIZE", 256))
+
+orderings = TTLCache(CURSOR_CACHE_SIZE, CURSOR_CACHE_TTL)
+
+
+def store_ordering(global_identities):
+    """Caches an ordering of customers and returns the key to find it."""
+    key = uuid.uuid4().hex
+    orderings.set(key, list(global_identities))
+    return key
+
+
+def get_ordering(key):
+    return orderings.get(key)
+
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns the state of a cursor, raises ValueError when it is malformed."""
+    # Decoding errors are all ValueErrors
+    state = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if not isinstance(state, dict):
+        raise ValueError("Malformed cursor")
+    return state
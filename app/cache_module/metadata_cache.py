@@ -0,0 +1,90 @@
+"""In-process cache of Center and Areas metadata.
+
+Centers and zones only change through update_center_info and the zone CRUD
+methods, which invalidate the entries they touch. Other processes see those
+changes once the TTL expires.
+"""
+from cassandra.cqlengine.query import DoesNotExist
+from app.center_module.center_models import Areas
+from app.persistence_module import repository
+from app.utils import zone_raster
+from .cache_utils import TTLCache
+import os
+
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", 60))
+METADATA_CACHE_NEGATIVE_TTL = float(os.getenv("METADATA_CACHE_NEGATIVE_TTL", 10))
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", 1024))
+ZONE_RASTER_CACHE_SIZE = int(os.getenv("ZONE_RASTER_CACHE_SIZE", 64))
+
+CENTER_NAMES_KEY = "center_names"
+
+# Cached in place of centers that do not exist
+_missing = object()
+
+centers = TTLCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL)
+areas = TTLCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL)
+zone_rasters = TTLCache(ZONE_RASTER_CACHE_SIZE, METADATA_CACHE_TTL)
+
+
+def get_center(name):
+    """Returns a copy of the center row as a dict.
+
+    Raises DoesNotExist for unknown centers, which are cached too.
+    """
+    center = centers.get(name)
+    if center is None:
+        try:
+            center = repository.get_center(name)
+            centers.set(name, center)
+        except DoesNotExist:
+            center = _missing
+            centers.set(name, center, METADATA_CACHE_NEGATIVE_TTL)
+    if center is _missing:
+        raise DoesNotExist(f"Center {name} not found")
+    return dict(center)
+
+
+def get_center_names():
+    center_names = centers.get(CENTER_NAMES_KEY)
+    if center_names is None:
+        center_names = repository.get_center_names()
+        centers.set(CENTER_NAMES_KEY, center_names)
+    return list(center_names)
+
+
+def get_areas(center_name, area_type=None):
+    """Returns the Areas of a center, optionally only those of one area_type."""
+    center_areas = areas.get(center_name)
+    if center_areas is None:
+        center_areas = list(Areas.objects(center_name=center_name).all())
+        areas.set(center_name, center_areas)
+    if area_type is None:
+        return list(center_areas)
+    return [area for area in center_areas if area.area_type == area_type]
+
+
+def get_zone_raster(center_name):
+    """Returns the zone label image of a center and the areas it labels.
+
+    The areas are (area_type, area_name) pairs, label i + 1 being the i-th one.
+    See app.utils.zone_raster and zone_labels.
+    """
+    raster = zone_rasters.get(center_name)
+    if raster is None:
+        center_areas = get_areas(center_name)
+        raster = (
+            zone_raster(center_areas),
+            [(area.area_type, area.area_name) for area in center_areas],
+        )
+        zone_rasters.set(center_name, raster)
+    return raster
+
+
+def invalidate_center(name):
+    centers.pop(name)
+    centers.pop(CENTER_NAMES_KEY)
+
+
+def invalidate_areas(center_name):
+    areas.pop(center_name)
+    zone_rasters.pop(center_name)
@@ -0,0 +1,175 @@
+"""Coalesces identical concurrent facade calls.
+
+The first call of a facade method with some arguments computes, the calls
+with the same arguments that arrive meanwhile wait for its result instead of
+repeating the work. Only calls in flight are shared, nothing is kept after.
+
+The threads of a process always coalesce. The workers of a uWSGI instance
+coalesce too when SINGLE_FLIGHT_UWSGI_CACHE names a uWSGI cache, e.g.
+--cache2 name=single_flight,items=256,blocksize=1048576. Results that do not
+fit a cache block are computed again by each waiting worker.
+"""
+from collections import namedtuple
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Response
+import copy
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import threading
+import time
+
+try:
+    import uwsgi
+except ImportError:
+    # Not running under uWSGI, e.g. flask run or the CLI
+    uwsgi = None
+
+SINGLE_FLIGHT_UWSGI_CACHE = os.getenv("SINGLE_FLIGHT_UWSGI_CACHE")
+SINGLE_FLIGHT_TIMEOUT = int(os.getenv("SINGLE_FLIGHT_TIMEOUT", 60))
+SINGLE_FLIGHT_RESULT_TTL = int(os.getenv("SINGLE_FLIGHT_RESULT_TTL", 5))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", 0.05))
+
+CallKey = namedtuple("CallKey", ["method", "arguments"])
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.error_response = None
+
+    def fail(self, error):
+        self.error = error
+        # Read before the leader's server finalizes the response
+        if isinstance(error, HTTPException) and error.response is not None:
+            self.error_response = (
+                error.response.get_data(),
+                error.response.status,
+                list(error.response.headers),
+            )
+
+    def error_copy(self):
+        """The error for a waiter, which must not share the leader's objects."""
+        error = copy.copy(self.error)
+        if self.error_response is not None:
+            body, status, headers = self.error_response
+            error.response = Response(body, status=status, headers=headers)
+        return error
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time, sharing its outcome."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error_copy()
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as error:
+            # abort()'s HTTPExceptions included, so duplicates get the same 400
+            call.fail(error)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+flights = SingleFlight()
+
+
+def normalize(value):
+    """Makes equal arguments equal keys, e.g. 1000.0 and 1000, lists and tuples."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize(item)) for key, item in value.items()))
+    return value
+
+
+def call_key(fn, args, kwargs):
+    """The method and its arguments by name, defaults filled in and normalized."""
+    arguments = inspect.signature(fn).bind(*args, **kwargs)
+    arguments.apply_defaults()
+    return CallKey(
+        fn.__qualname__,
+        tuple((name, normalize(value)) for name, value in arguments.arguments.items()),
+    )
+
+
+def _uwsgi_key(key, prefix):
+    return prefix + hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def _across_workers(key, fn, args, kwargs):
+    """Coalesces with the other uWSGI workers through their shared cache.
+
+    The worker that sets the key's flight entry computes and publishes the
+    result, the others poll until the entry is gone and read it.
+    """
+    cache = SINGLE_FLIGHT_UWSGI_CACHE
+    flight_key = _uwsgi_key(key, "flight:")
+    result_key = _uwsgi_key(key, "result:")
+
+    # Expires on its own if the worker dies mid-call
+    if uwsgi.cache_set(flight_key, b"", SINGLE_FLIGHT_TIMEOUT, cache):
+        # Left by an earlier flight, this one's followers must not read it
+        uwsgi.cache_del(result_key, cache)
+        try:
+            result = fn(*args, **kwargs)
+            try:
+                uwsgi.cache_update(
+                    result_key, pickle.dumps(result), SINGLE_FLIGHT_RESULT_TTL, cache
+                )
+            except Exception:
+                logging.exception(f"Could not share the result of {key.method}")
+            return result
+        finally:
+            uwsgi.cache_del(flight_key, cache)
+
+    deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+    while uwsgi.cache_exists(flight_key, cache) and time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+    result = uwsgi.cache_get(result_key, cache)
+    if result is None:
+        # The call failed, timed out or its result did not fit the cache
+        return fn(*args, **kwargs)
+    return pickle.loads(result)
+
+
+def coalesced(fn):
+    """Decorates a facade method so identical concurrent calls share one run.
+
+    The result is shared by every caller, who must not modify it.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = call_key(fn, args, kwargs)
+        if uwsgi is not None and SINGLE_FLIGHT_UWSGI_CACHE:
+            return flights.do(key, _across_workers, key, fn, args, kwargs)
+        return flights.do(key, fn, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,108 @@
+"""Cache of analytics over windows that ended in the past.
+
+Once a window's to_time is WINDOW_CACHE_SETTLE seconds old its frames no
+longer change, so its results are kept for WINDOW_CACHE_TTL in memory and,
+when WINDOW_CACHE_DIR is set, on disk, where restarted workers find them.
+Windows reaching into the last WINDOW_CACHE_SETTLE seconds are cached for
+WINDOW_CACHE_RECENT_TTL only, or not at all when it is 0.
+
+Results are stored pickled, so every caller gets its own copy. Files in
+WINDOW_CACHE_DIR may be deleted at any time.
+"""
+from .cache_utils import BytesLRUCache
+from .single_flight import call_key
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import time
+
+WINDOW_CACHE_MAX_BYTES = int(os.getenv("WINDOW_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+WINDOW_CACHE_TTL = float(os.getenv("WINDOW_CACHE_TTL", 24 * 60 * 60))
+WINDOW_CACHE_SETTLE = float(os.getenv("WINDOW_CACHE_SETTLE", 5 * 60))
+WINDOW_CACHE_RECENT_TTL = float(os.getenv("WINDOW_CACHE_RECENT_TTL", 10))
+WINDOW_CACHE_DIR = os.getenv("WINDOW_CACHE_DIR")
+
+results = BytesLRUCache(WINDOW_CACHE_MAX_BYTES)
+
+
+def _digest(value):
+    return hashlib.sha1(repr(value).encode()).hexdigest()
+
+
+def _center_dir(center_name):
+    return os.path.join(WINDOW_CACHE_DIR, _digest(center_name))
+
+
+def _disk_path(center_name, key):
+    return os.path.join(_center_dir(center_name), _digest(key) + ".pickle")
+
+
+def _read_disk(center_name, key):
+    """Returns the stored result and its remaining ttl, or None."""
+    path = _disk_path(center_name, key)
+    try:
+        with open(path, "rb") as disk_entry:
+            expires_at, value = pickle.load(disk_entry)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logging.exception(f"Unreadable window cache entry {path}")
+        return None
+    ttl = expires_at - time.time()
+    if ttl <= 0:
+        return None
+    return value, ttl
+
+
+def _write_disk(center_name, key, value, ttl):
+    center_dir = _center_dir(center_name)
+    try:
+        os.makedirs(center_dir, exist_ok=True)
+        # Written aside and renamed, so readers never see half an entry
+        with tempfile.NamedTemporaryFile(dir=center_dir, delete=False) as disk_entry:
+            pickle.dump((time.time() + ttl, value), disk_entry)
+        os.replace(disk_entry.name, _disk_path(center_name, key))
+    except OSError:
+        logging.exception(f"Could not write to the window cache in {center_dir}")
+
+
+def cached(center_argument="center", to_time_argument="to_time"):
+    """Caches a facade method whose result only depends on its arguments."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = call_key(fn, args, kwargs)
+            arguments = dict(key.arguments)
+            center_name = arguments[center_argument]
+            to_time = arguments[to_time_argument]
+            if center_name is None or not isinstance(to_time, (int, float)):
+                return fn(*args, **kwargs)
+            is_settled = to_time <= time.time() - WINDOW_CACHE_SETTLE
+            ttl = WINDOW_CACHE_TTL if is_settled else WINDOW_CACHE_RECENT_TTL
+            if ttl <= 0:
+                return fn(*args, **kwargs)
+
+            value = results.get((center_name, key))
+            if value is None and is_settled and WINDOW_CACHE_DIR:
+                disk_entry = _read_disk(center_name, key)
+                if disk_entry is not None:
+                    value, ttl = disk_entry
+                    results.set((center_name, key), value, ttl)
+            if value is not None:
+                return pickle.loads(value)
+
+            # abort()s raise, errors are never cached
+            result = fn(*args, **kwargs)
+            value = pickle.dumps(result)
+            results.set((center_name, key), value, ttl)
+            if is_settled and WINDOW_CACHE_DIR:
+                _write_disk(center_name, key, value, ttl)
+            return result
+
+        return wrapper
+
+    return decorator
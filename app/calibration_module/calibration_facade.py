@@ -1,7 +1,7 @@
 from flask import abort
 from cassandra.cqlengine.models import Model
 from cassandra.cqlengine import columns, connection
-from app.center_module.center_models import Center
+from app.cache_module import metadata_cache
 from app.calibration_module.calibration_models import Calibration
 from .calibration_utils import (
     camera_response_handler,
@@ -41,7 +41,7 @@ class CalibrationFacade:
         ):
             abort(400)
         try:
-            center_exist = Center.objects(name=camera_config.get("name")).get()
+            center_exist = metadata_cache.get_center(camera_config.get("name"))
             if center_exist:
                 camera_coords = np.array(camera_config.get("camera_coords"))
                 floor_coords = np.array(camera_config.get("floor_coords"))
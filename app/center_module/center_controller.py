@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, abort, make_response
+from flask import Blueprint, Response, request, jsonify, abort, make_response
 from .center_facade import CenterFacade
 from app.user_module.user_facade import UserFacade
 from app.timeline_module.timeline_facade import TimelineFacade
@@ -8,6 +8,8 @@ from app.utils import (
     MISSING_PARAMS,
     DEFAULT_PAGE,
     DEFAULT_PAGE_SIZE,
+    align_window,
+    window_headers,
 )
 from app.auth_tools import protected_endpoint
 from app import auto
@@ -320,7 +322,10 @@ def waiting_stats(role):
         center: String (center's name)
         from_time: float or int (Timestamp in seconds)
         to_time: float or int (Timestamp in seconds)
+        align: String (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
         live: Bool ( If data requested is meant to be live or not)
+        since: Integer (Optional with live=true, the until of the previous response)
     }
 
     Returns CenterWaitingStatistics {
@@ -339,6 +344,13 @@ def waiting_stats(role):
             }
         ]
     }
+
+    Returns with since a LiveDelta, see /customers, whose customers are {
+        global_identity: String
+        area: String
+        area_type: String
+        dwell_time: Int (Seconds in the current area)
+    }
     """
     if request.method == "GET":
         if request.args is None:
@@ -348,12 +360,22 @@ def waiting_stats(role):
             is_live = str(request.args.get("live")).lower() == "true"
             from_time = float(request.args.get("from_time"))
             to_time = float(request.args.get("to_time"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
+            since = request.args.get("since")
+            if since is not None:
+                since = int(since)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
-        resp = CenterFacade.get_center_waiting_stats(
-            center, from_time, to_time, is_live
-        )
-        return jsonify(resp)
+        if since is not None:
+            if not is_live:
+                abort(make_response(jsonify(error=INVALID_FORMAT), 400))
+            resp = CenterFacade.get_center_waiting_stats_delta(center, since)
+        else:
+            resp = CenterFacade.get_center_waiting_stats(
+                center, from_time, to_time, is_live
+            )
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @centers_controller.route("/area_happiness", methods=["GET"])
@@ -372,6 +394,8 @@ def area_happiness(role):
         center: String (center's name)
         from_time: float or int (Timestamp in seconds)
         to_time: float or int (Timestamp in seconds)
+        align: String (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
     }
 
     Result list of AreaWithHX [
@@ -391,12 +415,14 @@ def area_happiness(role):
         try:
             from_time = float(request.args.get("from_time"))
             to_time = float(request.args.get("to_time"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         if center is None or from_time is None or to_time is None:
             abort(make_response(jsonify(error=MISSING_PARAMS), 400))
         resp = CenterFacade.get_areas_hx(center, from_time, to_time)
-        return jsonify(resp)
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @centers_controller.route("/customers", methods=["GET"])
@@ -418,11 +444,16 @@ def customers_list():
      - live: Boolean (Customer's information in live)
      - page: Integer (Page number)
      - page_size: Integer (Size of each page)
+     - cursor: String (Optional, replaces page. Empty for the first page, then the
+       next_cursor of the previous one)
+     - since: Integer (Optional with live=true, replaces page and page_size. The
+       until of the previous response)
 
      Returns
          {
             total_customers: Integer
-            total_pages: Integer
+            total_pages: Integer (Only without cursor)
+            next_cursor: String (Only with cursor, null on the last page)
             customers: List<CustomerInfo>: {
                 id: String (Customer's ID)
                 date: String (Date)
@@ -440,25 +471,46 @@ def customers_list():
     """
 
     if request.method == "GET":
-        if request.args is None or len(request.args) < 6 or len(request.args) > 6:
-            if len(request.args) < 6:
+        # since replaces page and page_size
+        expected_args = 5 if "since" in request.args else 6
+        if (
+            request.args is None
+            or len(request.args) < expected_args
+            or len(request.args) > expected_args
+        ):
+            if len(request.args) < expected_args:
                 abort(make_response(jsonify(error=MISSING_PARAMS), 400))
             else:
                 abort(make_response(jsonify(error=INVALID_FORMAT), 400))
 
         page = request.args.get("page", DEFAULT_PAGE, type=int)
         page_size = request.args.get("page_size", DEFAULT_PAGE_SIZE, type=int)
+        cursor = request.args.get("cursor")
         center_name = request.args.get("center").strip()
         try:
             from_time = int(request.args.get("from_time"))
             to_time = int(request.args.get("to_time"))
             is_live = str(request.args.get("live")).lower() == "true"
+            since = request.args.get("since")
+            if since is not None:
+                since = int(since)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
 
-        resp = CenterFacade.get_customer_list(
-            center_name, from_time, to_time, is_live, page, page_size
-        )
+        if since is not None:
+            if not is_live:
+                abort(make_response(jsonify(error=INVALID_FORMAT), 400))
+            resp = CenterFacade.get_customer_list_delta(
+                center_name, from_time, to_time, since
+            )
+        elif cursor is not None:
+            resp = CenterFacade.get_customer_list_page(
+                center_name, from_time, to_time, is_live, cursor, page_size
+            )
+        else:
+            resp = CenterFacade.get_customer_list(
+                center_name, from_time, to_time, is_live, page, page_size
+            )
         return jsonify(resp)
 
 
@@ -477,7 +529,10 @@ def area_statistics():
      - center: String (Center's name)
      - from_time: Integer (Initial date)
      - to_time: Integer (End date)
+     - align: String (Optional, "minute", "hour" or "day". Widens the window to
+       whole ones, reported in the X-Window-From and X-Window-To headers)
      - live: Boolean (Customer's information in live)
+     - since: Integer (Optional with live=true, the until of the previous response)
 
      Returns
          {
@@ -491,11 +546,23 @@ def area_statistics():
             }
          }
 
+     Returns with since a LiveDelta, see /customers, whose customers are {
+        global_identity: String
+        area: String
+        area_type: String
+     }
+
     """
 
     if request.method == "GET":
-        if request.args is None or len(request.args) < 4 or len(request.args) > 4:
-            if len(request.args) < 4:
+        # since and align are optional
+        expected_args = 4 + len({"since", "align"} & set(request.args))
+        if (
+            request.args is None
+            or len(request.args) < expected_args
+            or len(request.args) > expected_args
+        ):
+            if len(request.args) < expected_args:
                 abort(make_response(jsonify(error=EMPTY_REQUEST), 400))
             else:
                 abort(make_response(jsonify(error=INVALID_FORMAT), 400))
@@ -504,14 +571,24 @@ def area_statistics():
         try:
             from_time = int(request.args.get("from_time"))
             to_time = int(request.args.get("to_time"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
             is_live = str(request.args.get("live")).lower() == "true"
+            since = request.args.get("since")
+            if since is not None:
+                since = int(since)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
 
-        resp = CenterFacade.get_center_area_statistics(
-            center_name, from_time, to_time, is_live
-        )
-        return jsonify(resp)
+        if since is not None:
+            if not is_live:
+                abort(make_response(jsonify(error=INVALID_FORMAT), 400))
+            resp = CenterFacade.get_center_area_statistics_delta(center_name, since)
+        else:
+            resp = CenterFacade.get_center_area_statistics(
+                center_name, from_time, to_time, is_live
+            )
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @centers_controller.route("/area_dwell_statistics", methods=["GET"])
@@ -529,6 +606,8 @@ def area_dwell_statistics():
      - center: String (Center's name)
      - from_time: Integer (Initial date)
      - to_time: Integer (End date)
+     - align: String (Optional, "minute", "hour" or "day". Widens the window to
+       whole ones, reported in the X-Window-From and X-Window-To headers)
 
      Returns
          {
@@ -544,8 +623,13 @@ def area_dwell_statistics():
     """
 
     if request.method == "GET":
-        if request.args is None or len(request.args) < 3 or len(request.args) > 3:
-            if len(request.args) < 3:
+        expected_args = 4 if "align" in request.args else 3
+        if (
+            request.args is None
+            or len(request.args) < expected_args
+            or len(request.args) > expected_args
+        ):
+            if len(request.args) < expected_args:
                 abort(make_response(jsonify(error=EMPTY_REQUEST), 400))
             else:
                 abort(make_response(jsonify(error=INVALID_FORMAT), 400))
@@ -554,13 +638,15 @@ def area_dwell_statistics():
             center_name = request.args.get("center").strip()
             from_time = int(request.args.get("from_time"))
             to_time = int(request.args.get("to_time"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
 
         resp = CenterFacade.get_center_area_dwell_statistics(
             center_name, from_time, to_time
         )
-        return jsonify(resp)
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @centers_controller.route("/customer_journey", methods=["GET"])
@@ -626,7 +712,10 @@ def people_waiting_demographics():
      - center: String (Center's name)
      - from_time: Integer (Initial date)
      - to_time: Integer (End date)
+     - align: String (Optional, "minute", "hour" or "day". Widens the window to
+       whole ones, reported in the X-Window-From and X-Window-To headers)
      - live: Boolean (Customer's information in live)
+     - approximate: Boolean (Optional, HyperLogLog estimates for long ranges)
 
      Response {
          Male: Int
@@ -643,12 +732,60 @@ def people_waiting_demographics():
             is_live = str(request.args.get("live")).lower() == "true"
             from_time = float(request.args.get("from_time"))
             to_time = float(request.args.get("to_time"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
+            approximate = str(request.args.get("approximate")).lower() == "true"
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         resp = CenterFacade.get_waiting_demographics(
-            center, from_time, to_time, is_live
+            center, from_time, to_time, is_live, approximate
+        )
+        return jsonify(resp), window_headers(from_time, to_time, align)
+
+
+@centers_controller.route("/live_feed", methods=["GET"])
+@auto.doc()
+@protected_endpoint()
+def live_feed():
+    """
+    LIVE FEED - GET /api/v1/centers/live_feed
+    Streams the live state of a center as Server-Sent Events, in place of polling
+    the live=true endpoints
+
+    Header {
+      Authorization: Auth Token - JWT
+    }
+
+    Params {
+        center: String (center's name)
+    }
+
+    Streams events {
+        snapshot: {
+            customers: List<CustomerTracker> (Customers in store)
+            occupancy: {area: Int (People count)}
+            waiting: {total: Int, Male: Int, Female: Int, Local: Int, Non: Int,
+              POD: Int} (People in Waiting areas)
+        }
+        delta: {
+            customers: {
+                changed: List<CustomerTracker> (New or updated customers)
+                left: List<String> (Ids of the customers gone)
+            }
+            occupancy: {area: Int} (Changed areas only, 0 once emptied)
+            waiting: {key: Int} (Changed counts only)
+        }
+    }
+    A snapshot may come again at any time, e.g. after a slow read; it replaces the
+    whole state.
+    """
+    if request.method == "GET":
+        events = CenterFacade.get_live_feed(request.args.get("center"))
+        return Response(
+            events,
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
-        return jsonify(resp)
 
 
 @centers_controller.route("/generate_report", methods=["GET"])
@@ -656,6 +793,39 @@ def people_waiting_demographics():
 @protected_endpoint(["general-manager", "center-manager"], return_role=True)
 def generate_report(role):
     """
+    CENTER REPORT - GET /api/v1/centers/generate_report
+    Builds every section of a center's report from a single scan of the window
+
+    Header {
+      Authorization: Auth Token - JWT
+    }
+
+    Params {
+        "center": "Headquarters", (The employee's center's name)
+        "from_time": 1591106400, (timestamp in seconds)
+        "to_time": 1591110470, (timestamp in seconds)
+        "align": "hour", (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
+    }
+
+    Returns {
+        hx_index: List<AverageTimeFrame> (Daily for windows over a day, else hourly)
+        customer_attendance: {
+            general: Attendance (As in /timeline/historic_attendance)
+            intervals: List<Attendance> (Per day with its from_time and to_time,
+              only for windows over a day)
+        }
+        waiting_time: [
+            {
+                time: Timestamp in seconds
+                total_ppl_waiting: Int (People seen in a Waiting area)
+                total_waiting_time: Int (Average minutes between their first and
+                  last frame there)
+            }
+        ]
+        most_traveled_journeys: List<JourneyUsage>
+        area_usage: JourneySummary (As in /timeline/journey-summary)
+    }
     """
     if request.method == "GET":
         if request.args is None:
@@ -664,48 +834,90 @@ def generate_report(role):
         try:
             from_time = float(request.args.get("from_time"))
             to_time = float(request.args.get("to_time"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         if center is None or from_time is None or to_time is None:
             abort(make_response(jsonify(error=MISSING_PARAMS), 400))
-        resp = {}
-        SECONDS_IN_A_DAY = 60 * 60 * 24
-        # GET HX HISTORY
-        if to_time - from_time > SECONDS_IN_A_DAY:
-            timeinterval = SECONDS_IN_A_DAY
-        else:
-            timeinterval = 60 * 60
-        hx_chart = TimelineFacade.get_history(
-            center, "happiness", from_time, to_time, timeinterval, role
-        )
-        resp.update({"hx_index": hx_chart})
-        # GET ATTENDANCE - General
-        general_attendance = TimelineFacade.get_historic_attendance(
-            center, from_time, to_time
-        )
-        # GET ATTENDANCE - per day
-        attendance_intervals = []
+        resp = TimelineFacade.get_report(center, from_time, to_time)
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
-        if to_time - from_time > SECONDS_IN_A_DAY:
-            # Todo: query each day
-            pass
 
-        resp.update(
-            {
-                "customer_attendance": {
-                    "general": general_attendance,
-                    "intervals": attendance_intervals,
-                }
-            }
-        )
-        # GET WAITING TIME CHART
-        # TODO FACADE of graph
-        # GET CUSTOMER MOST TRAVELED JOURNEYS
-        most_traveled_journeys = TimelineFacade.get_most_traveled_journey(
-            center, from_time, to_time
-        )
-        resp.update({"most_traveled_journeys": most_traveled_journeys})
-        # GET AREA/AREA_TYPE USAGE
-        # TODO FACADE
+@centers_controller.route("/report_jobs", methods=["POST"])
+@auto.doc()
+@protected_endpoint(["general-manager", "center-manager"])
+def submit_report_job():
+    """
+    SUBMIT REPORT JOB - POST /api/v1/centers/report_jobs
+    Queues a /generate_report on the background report pool
 
+    Header {
+      Authorization: Auth Token - JWT
+    }
+
+    Params {
+        "center": "Headquarters", (The employee's center's name)
+        "from_time": 1591106400, (timestamp in seconds)
+        "to_time": 1591110470, (timestamp in seconds)
+    }
+
+    Returns ReportJob {
+        job_id: String (Id to follow the job with)
+        center: String
+        from_time: Float
+        to_time: Float
+        status: String (queued, running, done or failed)
+        progress: Float (Fraction of the report done)
+        submitted_at: Timestamp in seconds
+        finished_at: Timestamp in seconds, null until done or failed
+        error: String, null unless failed
+    }
+    """
+    if request.method == "POST":
+        if request.args is None:
+            abort(make_response(jsonify(error=EMPTY_REQUEST), 400))
+        center = request.args.get("center")
+        try:
+            from_time = float(request.args.get("from_time"))
+            to_time = float(request.args.get("to_time"))
+        except (ValueError, TypeError):
+            abort(make_response(jsonify(error=INVALID_FORMAT), 400))
+        resp = CenterFacade.submit_report_job(center, from_time, to_time)
+        return jsonify(resp)
+
+
+@centers_controller.route("/report_jobs/<job_id>", methods=["GET"])
+@auto.doc()
+@protected_endpoint(["general-manager", "center-manager"])
+def report_job_status(job_id):
+    """
+    REPORT JOB STATUS - GET /api/v1/centers/report_jobs/<job_id>
+    Returns the ReportJob of a submitted report, see POST /report_jobs
+
+    Header {
+      Authorization: Auth Token - JWT
+    }
+
+    Finished jobs are kept for REPORT_JOB_TTL seconds.
+    """
+    if request.method == "GET":
+        resp = CenterFacade.get_report_job_status(job_id)
+        return jsonify(resp)
+
+
+@centers_controller.route("/report_jobs/<job_id>/result", methods=["GET"])
+@auto.doc()
+@protected_endpoint(["general-manager", "center-manager"])
+def report_job_result(job_id):
+    """
+    REPORT JOB RESULT - GET /api/v1/centers/report_jobs/<job_id>/result
+    Returns the report of a done job, as /generate_report does
+
+    Header {
+      Authorization: Auth Token - JWT
+    }
+    """
+    if request.method == "GET":
+        resp = CenterFacade.get_report_job_result(job_id)
         return jsonify(resp)
@@ -1,10 +1,33 @@
-from flask import abort, make_response, jsonify
+from flask import (
+    abort,
+    make_response,
+    jsonify,
+    copy_current_request_context,
+    current_app,
+    json as flask_json,
+)
+from werkzeug.exceptions import HTTPException
 from cassandra.cqlengine.models import Model
 from cassandra.cqlengine.query import BatchQuery
 from cassandra.cqlengine import columns, connection
-from app.timeline_module.timeline_models import CustomerTracker, DwellTime, Timeline
+from app.timeline_module.timeline_models import CustomerTracker, DwellTime
+from app.timeline_module.timeline_facade import TimelineFacade
+from app.timeline_module.timeline_reader import (
+    read_timeline_window,
+    read_dwell_times,
+    read_customer_timelines,
+)
+from app.persistence_module import repository
+from app.cache_module import metadata_cache, cursor_cache, single_flight
+from app import db
 from app.user_module.user_facade import UserFacade
-from .center_models import Center, Areas
+from .center_models import Center, Areas, ReportJob
+from .center_live import (
+    LIVE_DELTA_GRACE,
+    feed_events,
+    read_tracker,
+    tracker_history,
+)
 import datetime
 from app.calibration_module.calibration_facade import CalibrationFacade
 from app.utils import (
@@ -23,6 +46,10 @@ from app.utils import (
     AREA_NOT_FOUND,
     INVALID_TIME_RANGES,
     INVALID_PAGE_NUMBER,
+    INVALID_CURSOR,
+    REPORT_JOB_NOT_FOUND,
+    REPORT_NOT_READY,
+    LIVE_FEED_FULL,
 )
 import cassandra
 import numpy as np
@@ -30,6 +57,11 @@ import json
 import functools
 import base64
 import pandas as pd
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 area_highlight_type = "type"
 area_highlight_name = "name"
@@ -37,9 +69,263 @@ entry_area_type = "Entry"
 exit_area_type = "Exit"
 default_entrance_area = "Main Entrance"
 
+CENTER_INFO_WORKERS = 8
+center_info_executor = ThreadPoolExecutor(max_workers=CENTER_INFO_WORKERS)
+
+# Reports run on their own small pool so request workers stay free
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", 2))
+REPORT_JOB_TTL = int(os.getenv("REPORT_JOB_TTL", 60 * 60 * 24))
+report_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS)
+
+
+customer_list_columns = [
+    "center_name",
+    "epoch_second",
+    "global_identity",
+    "gender",
+    "happiness",
+    "age",
+    "ethnicity",
+    "area",
+    "area_type",
+]
+
+
+def _tracker_frame(customers):
+    """Tracker rows, as models or dicts, in the customer list frame layout."""
+    list_timelines = [
+        (
+            customerTracker["center_name"],
+            customerTracker["global_identity"],
+            customerTracker["gender"],
+            customerTracker["epoch_second"],
+            customerTracker["happiness_index"],
+            customerTracker["age_range"],
+            customerTracker["ethnicity"],
+            customerTracker["live_dwell_time"],
+            customerTracker["area"],
+            customerTracker["area_type"],
+        )
+        for customerTracker in customers
+        if all(customerTracker)
+    ]
+    return pd.DataFrame(
+        list_timelines,
+        columns=[
+            "center_name",
+            "global_identity",
+            "gender",
+            "epoch_second",
+            "happiness",
+            "age",
+            "ethnicity",
+            "live_dwell_time",
+            "area",
+            "area_type",
+        ],
+    )
+
+
+def _tracker_delta(center_name, since):
+    """Tracker rows seen from since onwards and the ids that left after it.
+
+    Rows stamped up to LIVE_DELTA_GRACE seconds before since are sent again,
+    as they may have been written after the read that returned since. When
+    this process cannot tell who left, every row is returned with full set,
+    for the client to replace its state.
+    """
+    rows, read_at = read_tracker(center_name)
+    left = tracker_history.left_since(center_name, since)
+    full = left is None
+    if not full:
+        rows = [
+            row
+            for row in rows
+            if row["epoch_second"] is not None
+            and row["epoch_second"] >= since - LIVE_DELTA_GRACE
+        ]
+    return {"since": since, "until": read_at, "full": full, "left": left or []}, rows
+
+
+def _customer_list_frames(
+    center_name, from_time, to_time, is_live, global_identities=None
+):
+    """Frames the customer list is built from, the tracker rows when live.
+
+    Only the frames of global_identities are read when given.
+    """
+    if is_live:
+        customers = CustomerTracker.objects(center_name=center_name)
+        if global_identities is not None:
+            customers = customers.filter(global_identity__in=global_identities)
+        return _tracker_frame(customers.all())
+
+    if global_identities is None:
+        return db.read_timeline_frame(
+            center_name, from_time, to_time, customer_list_columns
+        )
+    timelines = read_customer_timelines(
+        center_name, global_identities, from_time, to_time, customer_list_columns
+    )
+    return pd.DataFrame(
+        [frame for frames in timelines.values() for frame in frames],
+        columns=customer_list_columns,
+    )
+
+
+def _latest_customer_frames(df_db, is_live):
+    """Each customer's latest frame, the most recently seen customers first."""
+    if is_live:
+        # The tracker holds one row per customer
+        df_latest = df_db.drop_duplicates("global_identity")
+    else:
+        # The first of each customer's latest frames
+        df_latest = df_db.loc[df_db.groupby("global_identity")["epoch_second"].idxmax()]
+    return df_latest.sort_values("epoch_second", ascending=False, kind="mergesort")
+
+
+def _customer_list_rows(center_name, from_time, to_time, is_live, df_page, df_db):
+    """Builds the customer list entries of a page of latest frames.
+
+    df_db has to hold every frame of the page's customers, it may hold others.
+    """
+    page_identities = df_page["global_identity"].tolist()
+    df_page_frames = df_db[df_db["global_identity"].isin(page_identities)]
+    visited_areas = set(
+        zip(
+            df_page_frames["global_identity"],
+            df_page_frames["area_type"],
+            df_page_frames["area"],
+        )
+    )
+    visited_area_types = set(
+        (global_identity, area_type) for global_identity, area_type, _ in visited_areas
+    )
+
+    list_center_zone = CenterFacade.get_all_zones_name(center_name)
+    # Bounds widened by a second as the dwell lookup excludes them
+    dwell_times = read_dwell_times(
+        center_name,
+        page_identities,
+        list_center_zone,
+        int(from_time) - 1,
+        int(to_time) + 1,
+    )
+
+    areas = metadata_cache.get_areas(center_name)
+    list_areas_highlight = [
+        {
+            "area_name": area.area_name,
+            "area_type": area.area_type,
+            "highlight_on_customers": area.highlight_on_customers,
+        }
+        for area in areas
+        if all(area) and area.highlight_on_customers is not None
+    ]
+
+    response_list = []
+    for customer in df_page.itertuples(index=False):
+        global_identity = customer.global_identity
+        list_highlight_on_customers = []
+        list_process_area_type = []
+        for area in list_areas_highlight:
+            if (
+                area["highlight_on_customers"] == area_highlight_type
+                and area["area_type"] not in list_process_area_type
+            ):
+                list_highlight_on_customers.append(
+                    {
+                        "area_name": area["area_type"],
+                        "value": (global_identity, area["area_type"])
+                        in visited_area_types,
+                    }
+                )
+                list_process_area_type.append(area["area_type"])
+            elif area["highlight_on_customers"] == area_highlight_name:
+                list_highlight_on_customers.append(
+                    {
+                        "area_name": area["area_name"],
+                        "value": (global_identity, area["area_type"], area["area_name"])
+                        in visited_areas,
+                    }
+                )
+
+        happiness = customer.happiness
+        if pd.isna(happiness):
+            happiness = 0
+
+        dwell_time = dwell_times[global_identity]
+        if is_live and dwell_time > 0:
+            dwell_time += customer.live_dwell_time
+
+        response_list.append(
+            {
+                "id": global_identity,
+                "epoch_second": int(customer.epoch_second),
+                "dwell_time": dwell_time,
+                "gender": customer.gender,
+                "age": customer.age,
+                "ethnicity": customer.ethnicity,
+                "happiness": float(happiness),
+                "highlight_on_customers_areas": list_highlight_on_customers,
+            }
+        )
+    return response_list
+
+
+def _save_report_job(job):
+    """Rewrites the whole job row, which renews its TTL."""
+    ReportJob.ttl(REPORT_JOB_TTL).create(**job)
+
+
+def _report_job_status(job):
+    return {
+        "job_id": str(job["job_id"]),
+        "center": job["center_name"],
+        "from_time": job["from_time"],
+        "to_time": job["to_time"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "submitted_at": job["submitted_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+    }
+
+
+def _http_error(e):
+    """The error of an abort(), JSON ones or bare ones like abort(400)."""
+    body = e.response.get_json(silent=True) if e.response is not None else None
+    if isinstance(body, dict) and "error" in body:
+        return body["error"]
+    return e.description
+
+
+def _run_report_job(app, job):
+    with app.app_context():
+        job.update(status="running")
+        _save_report_job(job)
+
+        def on_progress(progress):
+            job["progress"] = progress
+            _save_report_job(job)
+
+        try:
+            report = TimelineFacade.get_report(
+                job["center_name"], job["from_time"], job["to_time"], on_progress
+            )
+            job.update(status="done", progress=1.0, result=flask_json.dumps(report))
+        except HTTPException as e:
+            job.update(status="failed", error=_http_error(e))
+        except Exception as e:
+            logging.exception(f"Report job {job['job_id']} failed")
+            job.update(status="failed", error=str(e))
+        job["finished_at"] = int(time.time())
+        _save_report_job(job)
+
 
 class CenterFacade:
     @staticmethod
+    @single_flight.coalesced
     def get_center_info(name, from_time, to_time):
         if name is None or from_time is None or to_time is None or from_time > to_time:
             abort(
@@ -48,9 +334,26 @@ class CenterFacade:
                 )
             )
 
+        # The four branches are independent, run them side by side
+        center_future = center_info_executor.submit(
+            copy_current_request_context(metadata_cache.get_center), name
+        )
+        cameras_future = center_info_executor.submit(
+            copy_current_request_context(CalibrationFacade.get_center_cameras), name
+        )
+        client_list_future = center_info_executor.submit(
+            copy_current_request_context(CenterFacade.get_client_list),
+            name,
+            from_time,
+            to_time,
+        )
+        employees_future = center_info_executor.submit(
+            copy_current_request_context(UserFacade.get_employees_from_center), name
+        )
+
         try:
             response = {}
-            center_info = dict(Center.objects(name=name).get())
+            center_info = dict(center_future.result())
             if center_info.get("floor_plan"):
                 floor_plan = {
                     "floor_plan": bytes2b64string(center_info.get("floor_plan")),
@@ -64,13 +367,11 @@ class CenterFacade:
 
             response.update(center_info)
 
-            center_cameras = CalibrationFacade.get_center_cameras(name)
+            center_cameras = cameras_future.result()
 
             response.update({"cameras": center_cameras})
 
-            center_client_ids_list = CenterFacade.get_client_list(
-                name, from_time, to_time
-            )
+            center_client_ids_list = client_list_future.result()
             avg_waiting_time = 0
             if len(center_client_ids_list) > 0:
                 avg_waiting_time = sum(
@@ -85,7 +386,7 @@ class CenterFacade:
 
             response.update({"customer_list": center_client_ids_list})
 
-            center_employee_list = UserFacade.get_employees_from_center(name)
+            center_employee_list = employees_future.result()
             response.update({"employee_list": center_employee_list})
 
             return response
@@ -114,26 +415,17 @@ class CenterFacade:
             in_store_clients_ids = [
                 dict(client) for client in query if client.area is not None
             ]
-            waiting_areas = Areas.objects(center_name=name, area_type="Waiting").all()
+            waiting_areas = metadata_cache.get_areas(name, "Waiting")
             waiting_areas = [area.area_name for area in waiting_areas]
+            waiting_times = read_dwell_times(
+                name,
+                [client["global_identity"] for client in in_store_clients_ids],
+                waiting_areas,
+                int(from_time),
+                int(to_time),
+            )
             for client in in_store_clients_ids:
-                query = DwellTime.objects(
-                    center_name=name,
-                    global_identity=client["global_identity"],
-                    area__in=waiting_areas,
-                    epoch_second__gt=int(from_time),
-                    epoch_second__lt=int(to_time),
-                ).all()
-
-                waiting_time = sum(
-                    [
-                        client.dwell_time
-                        for client in query
-                        if client.area in waiting_areas
-                        and client.dwell_time is not None
-                    ]
-                )
-                client["dwell_time"] = waiting_time
+                client["dwell_time"] = waiting_times[client["global_identity"]]
 
             return in_store_clients_ids
         except cassandra.cqlengine.query.DoesNotExist:
@@ -187,6 +479,7 @@ class CenterFacade:
                 )
         except cassandra.cqlengine.query.LWTException:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
+        metadata_cache.invalidate_center(new_data.get("name"))
 
         updated_center = Center.objects(name=new_data.get("name")).get()
         updated_center = dict(updated_center)
@@ -201,8 +494,7 @@ class CenterFacade:
 
     @staticmethod
     def get_all_centers_name():
-        query = Center.objects().only(["name"]).all()
-        names_list = [center.name for center in query]
+        names_list = metadata_cache.get_center_names()
         try:
             return names_list
         except cassandra.cqlengine.query.DoesNotExist:
@@ -213,9 +505,9 @@ class CenterFacade:
         if center_name is None:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
         try:
-            center_exist = Center.objects(name=center_name).get()
+            center_exist = metadata_cache.get_center(center_name)
             if center_exist:
-                query = Areas.objects(center_name=center_name).all()
+                query = metadata_cache.get_areas(center_name)
                 area_list = [area_response_handler(area) for area in query]
                 return area_list
         except cassandra.cqlengine.query.DoesNotExist:
@@ -226,9 +518,9 @@ class CenterFacade:
         if center_name is None:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
         try:
-            center_exists = Center.objects(name=center_name).get()
+            center_exists = metadata_cache.get_center(center_name)
             if center_exists:
-                query = Areas.objects(center_name=center_name).all()
+                query = metadata_cache.get_areas(center_name)
                 return list(set([area.area_name for area in query]))
         except cassandra.cqlengine.query.DoesNotExist:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
@@ -288,6 +580,7 @@ class CenterFacade:
                     )
                 )
                 batch.execute()
+                metadata_cache.invalidate_areas(new_zone.get("center_name"))
                 area = dict(query)
                 area.update({"polygon": bytes2json(area.get("polygon"))})
                 return area
@@ -297,6 +590,7 @@ class CenterFacade:
                     area_type=old_zone.get("area_type"),
                     area_name=old_zone.get("area_name"),
                 ).if_exists().update(polygon=byte_coords)
+                metadata_cache.invalidate_areas(old_zone.get("center_name"))
                 updated_area = old_zone
                 updated_area.update({"polygon": new_zone.get("coords")})
                 return updated_area
@@ -311,6 +605,7 @@ class CenterFacade:
             Areas.objects(
                 center_name=center_name, area_name=area, area_type=area_type
             ).if_exists().delete()
+            metadata_cache.invalidate_areas(center_name)
             return {"msg": "OK"}
         except cassandra.cqlengine.query.LWTException:
             abort(make_response(jsonify(error=AREA_NOT_FOUND), 400))
@@ -331,7 +626,7 @@ class CenterFacade:
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         byte_coords = json.dumps(new_zone.get("polygon")).encode("utf-8")
         try:
-            center_exists = Center.objects(name=new_zone.get("center_name")).get()
+            center_exists = metadata_cache.get_center(new_zone.get("center_name"))
             if center_exists:
                 query = (
                     Areas.objects(
@@ -347,6 +642,7 @@ class CenterFacade:
                         polygon=byte_coords,
                     )
                 )
+                metadata_cache.invalidate_areas(new_zone.get("center_name"))
 
                 area = dict(query)
                 area.update({"polygon": bytes2json(area.get("polygon"))})
@@ -358,6 +654,7 @@ class CenterFacade:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
     @staticmethod
+    @single_flight.coalesced
     def get_center_waiting_stats(center, from_time, to_time, is_live):
         if (
             center is None
@@ -372,12 +669,14 @@ class CenterFacade:
                 )
             )
 
-        customer_id_list = Timeline.objects(
-            center_name=center, epoch_second__gte=from_time, epoch_second__lte=to_time
-        ).all()
-        customer_id_list = [customer.global_identity for customer in customer_id_list]
+        customer_id_list = read_timeline_window(
+            center, from_time, to_time, ["global_identity"]
+        )
+        customer_id_list = [
+            customer["global_identity"] for customer in customer_id_list
+        ]
         customer_id_list = list(set(customer_id_list))
-        waiting_areas = Areas.objects(center_name=center, area_type="Waiting").all()
+        waiting_areas = metadata_cache.get_areas(center, "Waiting")
         waiting_areas = [area.area_name for area in waiting_areas]
 
         if not is_live:
@@ -439,6 +738,7 @@ class CenterFacade:
         }
 
     @staticmethod
+    @single_flight.coalesced
     def get_areas_hx(center, from_time, to_time):
         if (
             center is None
@@ -451,13 +751,13 @@ class CenterFacade:
                     jsonify(error="{NULL_PARAMS} and {INVALID_TIME_RANGES}"), 400
                 )
             )
-        query = Timeline.objects(
-            center_name=center, epoch_second__gte=from_time, epoch_second__lte=to_time
-        ).all()
+        query = read_timeline_window(
+            center, from_time, to_time, ["area", "area_type", "happiness"]
+        )
         items = [
-            dict(item)
+            item
             for item in query
-            if item.happiness is not None and item["area_type"] != "Free"
+            if item["happiness"] is not None and item["area_type"] != "Free"
         ]
         areas = CenterFacade.get_all_zones(center)
 
@@ -503,296 +803,128 @@ class CenterFacade:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
 
         try:
-            center_exist = Center.objects(name=center_name).get()
-            if center_exist:
-
-                if is_live:
-                    customers = CustomerTracker.objects(center_name=center_name).all()
-
-                    list_timelines = [
-                        (
-                            customerTracker.center_name,
-                            customerTracker.global_identity,
-                            customerTracker.gender,
-                            customerTracker.epoch_second,
-                            customerTracker.happiness_index,
-                            customerTracker.age_range,
-                            customerTracker.ethnicity,
-                            customerTracker.live_dwell_time,
-                            customerTracker.area,
-                            customerTracker.area_type,
-                        )
-                        for customerTracker in customers
-                        if all(customerTracker)
-                    ]
-                    df_db = pd.DataFrame(
-                        list_timelines,
-                        columns=[
-                            "center_name",
-                            "global_identity",
-                            "gender",
-                            "epoch_second",
-                            "happiness",
-                            "age",
-                            "ethnicity",
-                            "live_dwell_time",
-                            "area",
-                            "area_type",
-                        ],
-                    )
-                    if len(df_db) <= 0:
-                        return {"total_customers": 0, "total_pages": 0, "customers": []}
-
-                    global_identities = []
-                    for index, row in df_db.iterrows():
-                        global_identities.append(
-                            {
-                                "global_identity": row["global_identity"],
-                                "epoch_second": row["epoch_second"],
-                            }
-                        )
-
-                    global_identities.sort(
-                        key=CenterFacade.takeCustomerEpochSecond, reverse=True
-                    )
-
-                else:
-                    customers = Timeline.objects(
-                        center_name=center_name,
-                        epoch_second__gte=int(from_time),
-                        epoch_second__lte=int(to_time),
-                    ).all()
-                    list_timelines = [
-                        (
-                            timeline.center_name,
-                            timeline.epoch_second,
-                            timeline.global_identity,
-                            timeline.gender,
-                            timeline.happiness,
-                            timeline.age,
-                            timeline.ethnicity,
-                            timeline.area,
-                            timeline.area_type,
-                        )
-                        for timeline in customers
-                        if all(timeline)
-                    ]
-
-                    df_db = pd.DataFrame(
-                        list_timelines,
-                        columns=[
-                            "center_name",
-                            "epoch_second",
-                            "global_identity",
-                            "gender",
-                            "happiness",
-                            "age",
-                            "ethnicity",
-                            "area",
-                            "area_type",
-                        ],
-                    )
-
-                    if len(df_db) <= 0:
-                        return {"total_customers": 0, "total_pages": 0, "customers": []}
-
-                    global_identities = []
-                    df_global_indentity = (
-                        df_db[["global_identity", "epoch_second"]]
-                        .groupby("global_identity", as_index=False)
-                        .max()
-                    )
-
-                    for index, row in df_global_indentity.iterrows():
-                        global_identities.append(
-                            {
-                                "global_identity": row["global_identity"],
-                                "epoch_second": row["epoch_second"],
-                            }
-                        )
-
-                    global_identities.sort(
-                        key=CenterFacade.takeCustomerEpochSecond, reverse=True
-                    )
+            metadata_cache.get_center(center_name)
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
-                total_customers = len(global_identities)
-                total_pages = int(total_customers / page_size)
-                if total_customers % page_size != 0:
-                    total_pages += 1
-                if (page + 1) > total_pages:
-                    abort(make_response(jsonify(error=INVALID_PAGE_NUMBER), 400))
+        df_db = _customer_list_frames(center_name, from_time, to_time, is_live)
+        if len(df_db) <= 0:
+            return {"total_customers": 0, "total_pages": 0, "customers": []}
+        df_latest = _latest_customer_frames(df_db, is_live)
 
-                list_center_zone = CenterFacade.get_all_zones_name(center_name)
+        total_customers = len(df_latest)
+        total_pages = int(total_customers / page_size)
+        if total_customers % page_size != 0:
+            total_pages += 1
+        if (page + 1) > total_pages:
+            abort(make_response(jsonify(error=INVALID_PAGE_NUMBER), 400))
 
-                global_identities_ids = [
-                    global_identity["global_identity"]
-                    for global_identity in global_identities
-                ]
+        # Only the customers of the page are looked into
+        df_page = df_latest.iloc[page * page_size : page * page_size + page_size]
+        return {
+            "total_customers": total_customers,
+            "total_pages": total_pages,
+            "customers": _customer_list_rows(
+                center_name, from_time, to_time, is_live, df_page, df_db
+            ),
+        }
 
-                dwell_query = DwellTime.objects(
-                    center_name=center_name,
-                    global_identity__in=global_identities_ids,
-                    area__in=list_center_zone,
-                    epoch_second__gte=int(from_time),
-                    epoch_second__lte=int(to_time),
-                ).all()
-                list_dwell = [
-                    (
-                        dwell.center_name,
-                        dwell.epoch_second,
-                        dwell.global_identity,
-                        dwell.dwell_time,
-                    )
-                    for dwell in dwell_query
-                ]
+    @staticmethod
+    def get_customer_list_page(
+        center_name, from_time, to_time, is_live, cursor, page_size
+    ):
+        """Customer list page following a cursor, or the first one when it is empty.
+
+        The first page caches the customers' order; the next ones only read the
+        frames of their own customers.
+        """
+        if (
+            center_name is None
+            or from_time is None
+            or to_time is None
+            or is_live is None
+            or cursor is None
+            or from_time > to_time
+            or page_size < 1
+        ):
+            abort(make_response(jsonify(error=NULL_PARAMS), 400))
 
-                df_dwell_db = pd.DataFrame(
-                    list_dwell,
-                    columns=[
-                        "center_name",
-                        "epoch_second",
-                        "global_identity",
-                        "dwell_time",
-                    ],
-                ).dropna()
+        window = {
+            "center": center_name,
+            "from_time": from_time,
+            "to_time": to_time,
+            "live": is_live,
+        }
+        ordering_key = None
+        offset = 0
+        if cursor:
+            try:
+                state = cursor_cache.decode_cursor(cursor)
+                ordering_key = state["ordering"]
+                offset = int(state["offset"])
+            except (ValueError, KeyError, TypeError):
+                abort(make_response(jsonify(error=INVALID_CURSOR), 400))
+            if offset < 0 or state.get("window") != window:
+                abort(make_response(jsonify(error=INVALID_CURSOR), 400))
 
-                df_dwell_sum = (
-                    df_dwell_db[["global_identity", "dwell_time"]]
-                    .groupby(["global_identity"], as_index=False)
-                    .sum()
-                )
+        try:
+            metadata_cache.get_center(center_name)
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
-                response_list = []
-                areas = Areas.objects(center_name=center_name).all()
-                list_areas_highlight = [
-                    {
-                        "area_name": area.area_name,
-                        "area_type": area.area_type,
-                        "highlight_on_customers": area.highlight_on_customers,
-                    }
-                    for area in areas
-                    if all(area) and area.highlight_on_customers is not None
+        ordering = cursor_cache.get_ordering(ordering_key) if ordering_key else None
+        if ordering is None:
+            # First page, or a cursor whose ordering expired or lives in
+            # another process: order the whole window again
+            df_db = _customer_list_frames(center_name, from_time, to_time, is_live)
+            if len(df_db) <= 0:
+                return {"total_customers": 0, "customers": [], "next_cursor": None}
+            df_latest = _latest_customer_frames(df_db, is_live)
+            ordering = df_latest["global_identity"].tolist()
+            ordering_key = cursor_cache.store_ordering(ordering)
+            df_page = df_latest.iloc[offset : offset + page_size]
+        else:
+            page_identities = ordering[offset : offset + page_size]
+            df_db = _customer_list_frames(
+                center_name, from_time, to_time, is_live, page_identities
+            )
+            if len(df_db) <= 0:
+                df_page = df_db
+            else:
+                # Keep the cached order, customers gone since are left out
+                positions = {
+                    global_identity: position
+                    for position, global_identity in enumerate(page_identities)
+                }
+                df_page = _latest_customer_frames(df_db, is_live)
+                df_page = df_page.iloc[
+                    df_page["global_identity"]
+                    .map(positions)
+                    .values.argsort(kind="mergesort")
                 ]
 
-                for customer in global_identities[
-                    page * page_size : page * page_size + page_size
-                ]:
-                    list_highlight_on_customers = []
-                    list_process_area_type = []
-                    for area in list_areas_highlight:
-                        if (
-                            area["highlight_on_customers"] == area_highlight_type
-                            and area["area_type"] not in list_process_area_type
-                        ):
-                            df_area = df_db[
-                                (
-                                    df_db["global_identity"]
-                                    == customer["global_identity"]
-                                )
-                                & (df_db["area_type"] == area["area_type"])
-                            ]
-                            list_highlight_on_customers.append(
-                                {
-                                    "area_name": area["area_type"],
-                                    "value": len(df_area) > 0,
-                                }
-                            )
-                            list_process_area_type.append(area["area_type"])
-                        elif area["highlight_on_customers"] == area_highlight_name:
-                            df_area = df_db[
-                                (
-                                    df_db["global_identity"]
-                                    == customer["global_identity"]
-                                )
-                                & (df_db["area_type"] == area["area_type"])
-                                & (df_db["area"] == area["area_name"])
-                            ]
-                            list_highlight_on_customers.append(
-                                {
-                                    "area_name": area["area_name"],
-                                    "value": len(df_area) > 0,
-                                }
-                            )
-
-                    if is_live:
-                        df_happiness_global_identity = df_db[
-                            df_db["global_identity"] == customer["global_identity"]
-                        ]
-                        global_identity_epoch = df_happiness_global_identity[
-                            "epoch_second"
-                        ].iloc[0]
+        if offset > 0 and offset >= len(ordering):
+            abort(make_response(jsonify(error=INVALID_CURSOR), 400))
 
-                    else:
-                        latest_epoch_second = df_db[
-                            df_db["global_identity"] == customer["global_identity"]
-                        ]["epoch_second"].max()
-
-                        df_happiness_global_identity = df_db[
-                            (df_db["global_identity"] == customer["global_identity"])
-                            & (df_db["epoch_second"] == latest_epoch_second)
-                        ]
-                        global_identity_epoch = latest_epoch_second
-
-                    age = df_happiness_global_identity["age"].iloc[0]
-                    happiness = df_happiness_global_identity["happiness"].iloc[0]
-                    gender = df_happiness_global_identity["gender"].iloc[0]
-                    ethnicity = df_happiness_global_identity["ethnicity"].iloc[0]
-
-                    if pd.isna(happiness):
-                        happiness = 0
-
-                    if len(df_dwell_sum) > 0:
-                        df_dwell_global = df_dwell_sum[
-                            df_dwell_sum["global_identity"]
-                            == customer["global_identity"]
-                        ]
-
-                        if len(df_dwell_global) > 0:
-                            if is_live == True:
-                                df_customer_tracker = df_db[
-                                    df_db["global_identity"]
-                                    == customer["global_identity"]
-                                ]
-                                time_passed = df_customer_tracker[
-                                    "live_dwell_time"
-                                ].iloc[0]
-                                dwell_time = (
-                                    df_dwell_global["dwell_time"].iloc[0] + time_passed
-                                )
-
-                            else:
-                                dwell_time = df_dwell_global["dwell_time"].iloc[0]
-                        else:
-                            dwell_time = 0
-                    else:
-                        dwell_time = 0
-
-                    response_list.append(
-                        {
-                            "id": customer["global_identity"],
-                            "epoch_second": int(global_identity_epoch),
-                            "dwell_time": dwell_time,
-                            "gender": gender,
-                            "age": age,
-                            "ethnicity": ethnicity,
-                            "happiness": float(happiness),
-                            "highlight_on_customers_areas": list_highlight_on_customers,
-                        }
-                    )
-                response_list.sort(
-                    key=CenterFacade.takeCustomerEpochSecond, reverse=True
-                )
-
-            return {
-                "total_customers": total_customers,
-                "total_pages": total_pages,
-                "customers": response_list,
-            }
-
-        except cassandra.cqlengine.query.DoesNotExist:
-            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
+        next_cursor = None
+        if offset + page_size < len(ordering):
+            next_cursor = cursor_cache.encode_cursor(
+                {
+                    "ordering": ordering_key,
+                    "offset": offset + page_size,
+                    "window": window,
+                }
+            )
+        return {
+            "total_customers": len(ordering),
+            "customers": _customer_list_rows(
+                center_name, from_time, to_time, is_live, df_page, df_db
+            ),
+            "next_cursor": next_cursor,
+        }
 
     @staticmethod
+    @single_flight.coalesced
     def get_center_area_statistics(center_name, from_time, to_time, is_live):
         if (
             center_name is None
@@ -804,9 +936,9 @@ class CenterFacade:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
 
         try:
-            center_exist = Center.objects(name=center_name).get()
+            center_exist = metadata_cache.get_center(center_name)
             if center_exist:
-                areas = Areas.objects(center_name=center_name).all()
+                areas = metadata_cache.get_areas(center_name)
                 encoding = "utf-8"
 
                 list_areas = [
@@ -843,26 +975,17 @@ class CenterFacade:
                         for timeline in customers
                         if all(timeline)
                     ]
+                    df_db = pd.DataFrame(
+                        list_timelines,
+                        columns=["center_name", "global_identity", "area", "area_type"],
+                    ).dropna()
                 else:
-                    customers = Timeline.objects(
-                        center_name=center_name,
-                        epoch_second__gte=int(from_time),
-                        epoch_second__lte=int(to_time),
-                    ).all()
-                    list_timelines = [
-                        (
-                            timeline.center_name,
-                            timeline.global_identity,
-                            timeline.area,
-                            timeline.area_type,
-                        )
-                        for timeline in customers
-                        if all(timeline)
-                    ]
-                df_db = pd.DataFrame(
-                    list_timelines,
-                    columns=["center_name", "global_identity", "area", "area_type"],
-                ).dropna()
+                    df_db = db.read_timeline_frame(
+                        center_name,
+                        from_time,
+                        to_time,
+                        ["center_name", "global_identity", "area", "area_type"],
+                    ).dropna()
                 if len(df_db) <= 0:
                     return {"clients": 0, "areas": list_areas}
 
@@ -937,6 +1060,7 @@ class CenterFacade:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
     @staticmethod
+    @single_flight.coalesced
     def get_center_area_dwell_statistics(center_name, from_time, to_time):
         if (
             center_name is None
@@ -947,9 +1071,9 @@ class CenterFacade:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
 
         try:
-            center_exist = Center.objects(name=center_name).get()
+            center_exist = metadata_cache.get_center(center_name)
             if center_exist:
-                areas = Areas.objects(center_name=center_name).all()
+                areas = metadata_cache.get_areas(center_name)
                 encoding = "utf-8"
                 list_areas = [
                     {
@@ -1017,9 +1141,9 @@ class CenterFacade:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
 
         try:
-            center_exist = Center.objects(name=center_name).get()
+            center_exist = metadata_cache.get_center(center_name)
             if center_exist:
-                areas = Areas.objects(center_name=center_name).all()
+                areas = metadata_cache.get_areas(center_name)
                 areas_type = {}
 
                 for area in areas:
@@ -1063,16 +1187,18 @@ class CenterFacade:
                             area["dwell_time"]
                         )
 
-                customers = Timeline.objects(
-                    center_name=center_name,
-                    epoch_second__gte=int(min_epoch_second),
-                    epoch_second__lte=int(max_epoch_second),
-                ).all()
+                customers = repository.read_customer_timeline(
+                    center_name,
+                    global_identity,
+                    min_epoch_second,
+                    max_epoch_second,
+                    ["epoch_second", "area", "happiness"],
+                )
 
                 list_timelines = [
-                    (timeline.epoch_second, timeline.area, timeline.happiness,)
+                    (timeline["epoch_second"], timeline["area"], timeline["happiness"],)
                     for timeline in customers
-                    if all(timeline) and timeline.global_identity == global_identity
+                    if all(timeline)
                 ]
 
                 df_db = pd.DataFrame(
@@ -1106,7 +1232,10 @@ class CenterFacade:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
     @staticmethod
-    def get_waiting_demographics(center, from_time, to_time, is_live):
+    @single_flight.coalesced
+    def get_waiting_demographics(
+        center, from_time, to_time, is_live, approximate=False
+    ):
         if (
             center is None
             or from_time is None
@@ -1116,22 +1245,10 @@ class CenterFacade:
         ):
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
         try:
-            center_exists = Center.objects(name=center).get()
+            center_exists = metadata_cache.get_center(center)
         except cassandra.cqlengine.query.DoesNotExist:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
         if center_exists:
-            if is_live:
-                customers = CustomerTracker.objects(center_name=center).all()
-            else:
-                customers = Timeline.objects(
-                    center_name=center,
-                    epoch_second__gte=from_time,
-                    epoch_second__lte=to_time,
-                ).all()
-            waiting_customers = [
-                customer for customer in customers if customer.area_type == "Waiting"
-            ]
-            checked_id_list = []
             response = {
                 "Male": 0,
                 "Female": 0,
@@ -1139,12 +1256,175 @@ class CenterFacade:
                 "Non": 0,
                 "POD": 0,
             }
-            for customer in waiting_customers:
-                if customer.global_identity not in checked_id_list:
-                    checked_id_list.append(customer.global_identity)
-                    if customer.gender is not None:
-                        response[customer.gender] += 1
-                    if customer.ethnicity is not None:
-                        response[customer.ethnicity] += 1
+            if approximate and not is_live:
+                sketches = TimelineFacade.get_attendance_sketches(
+                    center, from_time, to_time
+                )
+                for category in response:
+                    if "waiting_" + category in sketches:
+                        response[category] = sketches["waiting_" + category].count()
+                return response
+
+            if is_live:
+                customers = CustomerTracker.objects(center_name=center).all()
+            else:
+                customers = read_timeline_window(
+                    center,
+                    from_time,
+                    to_time,
+                    ["global_identity", "area_type", "gender", "ethnicity"],
+                )
+            checked_ids = set()
+            for customer in customers:
+                if customer["area_type"] != "Waiting":
+                    continue
+                if customer["global_identity"] not in checked_ids:
+                    checked_ids.add(customer["global_identity"])
+                    if customer["gender"] is not None:
+                        response[customer["gender"]] += 1
+                    if customer["ethnicity"] is not None:
+                        response[customer["ethnicity"]] += 1
             return response
 
+    @staticmethod
+    def submit_report_job(center, from_time, to_time):
+        """Queues a center report on the report pool and returns the job status."""
+        if center is None or from_time is None or to_time is None:
+            abort(make_response(jsonify(error=NULL_PARAMS), 400))
+        if from_time >= to_time:
+            abort(make_response(jsonify(error=INVALID_TIME_RANGES), 400))
+        try:
+            metadata_cache.get_center(center)
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
+
+        job = {
+            "job_id": uuid.uuid4(),
+            "center_name": center,
+            "from_time": from_time,
+            "to_time": to_time,
+            "status": "queued",
+            "progress": 0.0,
+            "submitted_at": int(time.time()),
+            "finished_at": None,
+            "error": None,
+            "result": None,
+        }
+        _save_report_job(job)
+        report_executor.submit(
+            _run_report_job, current_app._get_current_object(), dict(job)
+        )
+        return _report_job_status(job)
+
+    @staticmethod
+    def get_report_job(job_id):
+        try:
+            job_id = uuid.UUID(job_id)
+        except (ValueError, TypeError, AttributeError):
+            abort(make_response(jsonify(error=INVALID_FORMAT), 400))
+        try:
+            return ReportJob.objects(job_id=job_id).get()
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=REPORT_JOB_NOT_FOUND), 400))
+
+    @staticmethod
+    def get_report_job_status(job_id):
+        return _report_job_status(CenterFacade.get_report_job(job_id))
+
+    @staticmethod
+    def get_report_job_result(job_id):
+        job = CenterFacade.get_report_job(job_id)
+        if job.status == "failed":
+            abort(make_response(jsonify(error=job.error), 400))
+        if job.status != "done":
+            abort(make_response(jsonify(error=REPORT_NOT_READY), 400))
+        return json.loads(job.result)
+
+    @staticmethod
+    def get_live_feed(center):
+        """Server-Sent Events of the center's tracker, see center_live."""
+        if center is None:
+            abort(make_response(jsonify(error=NULL_PARAMS), 400))
+        try:
+            metadata_cache.get_center(center)
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
+        events = feed_events(center)
+        if events is None:
+            abort(make_response(jsonify(error=LIVE_FEED_FULL), 503))
+        return events
+
+    @staticmethod
+    def get_customer_list_delta(center_name, from_time, to_time, since):
+        """Live customer list entries of the customers seen from since onwards."""
+        if (
+            center_name is None
+            or from_time is None
+            or to_time is None
+            or since is None
+            or from_time > to_time
+        ):
+            abort(make_response(jsonify(error=NULL_PARAMS), 400))
+        try:
+            metadata_cache.get_center(center_name)
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
+
+        delta, rows = _tracker_delta(center_name, since)
+        delta["customers"] = []
+        df_db = _tracker_frame(rows)
+        if len(df_db) > 0:
+            delta["customers"] = _customer_list_rows(
+                center_name,
+                from_time,
+                to_time,
+                True,
+                _latest_customer_frames(df_db, True),
+                df_db,
+            )
+        return delta
+
+    @staticmethod
+    def get_center_area_statistics_delta(center_name, since):
+        """Areas of the customers seen from since onwards, for live area statistics."""
+        if center_name is None or since is None:
+            abort(make_response(jsonify(error=NULL_PARAMS), 400))
+        try:
+            metadata_cache.get_center(center_name)
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
+
+        delta, rows = _tracker_delta(center_name, since)
+        delta["customers"] = [
+            {
+                "global_identity": row["global_identity"],
+                "area": row["area"],
+                "area_type": row["area_type"],
+            }
+            for row in rows
+        ]
+        return delta
+
+    @staticmethod
+    def get_center_waiting_stats_delta(center, since):
+        """Areas and dwell times of the customers seen from since onwards."""
+        if center is None or since is None:
+            abort(make_response(jsonify(error=NULL_PARAMS), 400))
+        try:
+            metadata_cache.get_center(center)
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
+
+        delta, rows = _tracker_delta(center, since)
+        delta["customers"] = [
+            {
+                "global_identity": row["global_identity"],
+                "area": row["area"],
+                "area_type": row["area_type"],
+                "dwell_time": row["live_dwell_time"]
+                if row["live_dwell_time"] is not None
+                else 0,
+            }
+            for row in rows
+        ]
+        return delta
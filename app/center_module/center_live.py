@@ -0,0 +1,289 @@
+"""Live view of the CustomerTracker shared by the dashboards of a process.
+
+A single background thread reads the tracker of each watched center once per
+tick and pushes what changed to every subscriber of that center, so the load
+on Cassandra follows the number of centers, not of open dashboards.
+"""
+from app.persistence_module import repository
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+LIVE_FEED_INTERVAL = float(os.getenv("LIVE_FEED_INTERVAL", 2))
+LIVE_FEED_KEEPALIVE = float(os.getenv("LIVE_FEED_KEEPALIVE", 5))
+LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", 32))
+LIVE_DELTA_RETENTION = float(os.getenv("LIVE_DELTA_RETENTION", 15 * 60))
+# Tracker rows are stamped by the ingest pipeline, which may lag the server
+# clock that a delta's until comes from
+LIVE_DELTA_GRACE = float(os.getenv("LIVE_DELTA_GRACE", 30))
+# Each open stream holds a server thread, those left over serve the API. A
+# disconnected client's stream is only closed, and its slot freed, when the
+# next event or keepalive write fails, up to LIVE_FEED_KEEPALIVE seconds later.
+LIVE_FEED_MAX_STREAMS = int(os.getenv("LIVE_FEED_MAX_STREAMS", 4))
+
+waiting_area_type = "Waiting"
+
+
+def tracker_state(rows):
+    """Customers in store, clients per area and waiting demographics."""
+    customers = {
+        row["global_identity"]: dict(row) for row in rows if row["area"] is not None
+    }
+    occupancy = {}
+    waiting = {"total": 0, "Male": 0, "Female": 0, "Local": 0, "Non": 0, "POD": 0}
+    for customer in customers.values():
+        occupancy[customer["area"]] = occupancy.get(customer["area"], 0) + 1
+        if customer["area_type"] != waiting_area_type:
+            continue
+        waiting["total"] += 1
+        for value in [customer["gender"], customer["ethnicity"]]:
+            if value is not None:
+                waiting[value] = waiting.get(value, 0) + 1
+    return {"customers": customers, "occupancy": occupancy, "waiting": waiting}
+
+
+def state_snapshot(state):
+    return {
+        "customers": list(state["customers"].values()),
+        "occupancy": state["occupancy"],
+        "waiting": state["waiting"],
+    }
+
+
+def state_delta(old_state, new_state):
+    """What changed between two tracker states, None when nothing did.
+
+    Changed values are sent whole, areas that emptied are sent as 0.
+    """
+    changed = [
+        customer
+        for global_identity, customer in new_state["customers"].items()
+        if old_state["customers"].get(global_identity) != customer
+    ]
+    left = [
+        global_identity
+        for global_identity in old_state["customers"]
+        if global_identity not in new_state["customers"]
+    ]
+    occupancy = {
+        area: new_state["occupancy"].get(area, 0)
+        for area in set(old_state["occupancy"]) | set(new_state["occupancy"])
+        if old_state["occupancy"].get(area, 0) != new_state["occupancy"].get(area, 0)
+    }
+    waiting = {
+        key: value
+        for key, value in new_state["waiting"].items()
+        if old_state["waiting"].get(key) != value
+    }
+    if not (changed or left or occupancy or waiting):
+        return None
+    return {
+        "customers": {"changed": changed, "left": left},
+        "occupancy": occupancy,
+        "waiting": waiting,
+    }
+
+
+class TrackerHistory:
+    """Remembers when customers left each center's tracker, as seen by this process.
+
+    Departures are dated by the tracker read that first missed the customer,
+    which is never earlier than the actual departure.
+    """
+
+    def __init__(self, retention=LIVE_DELTA_RETENTION):
+        self.retention = retention
+        self._present = {}
+        self._read_at = {}
+        self._departures = {}
+        self._observed_from = {}
+        self._lock = threading.Lock()
+
+    def observe(self, center_name, global_identities, read_at):
+        global_identities = set(global_identities)
+        with self._lock:
+            # A slower read that started earlier has nothing to add
+            if read_at < self._read_at.get(center_name, read_at):
+                return
+            self._read_at[center_name] = read_at
+            present = self._present.get(center_name)
+            departures = self._departures.setdefault(center_name, {})
+            if present is None:
+                self._observed_from[center_name] = read_at
+            else:
+                for global_identity in present - global_identities:
+                    departures[global_identity] = read_at
+            for global_identity in global_identities:
+                departures.pop(global_identity, None)
+            self._present[center_name] = global_identities
+
+            horizon = read_at - self.retention
+            for global_identity, left_at in list(departures.items()):
+                if left_at <= horizon:
+                    del departures[global_identity]
+            self._observed_from[center_name] = max(
+                self._observed_from[center_name], horizon
+            )
+
+    def left_since(self, center_name, since):
+        """Ids that left after since, None when this process cannot tell."""
+        with self._lock:
+            observed_from = self._observed_from.get(center_name)
+            if observed_from is None or since < observed_from:
+                return None
+            return [
+                global_identity
+                for global_identity, left_at in self._departures[center_name].items()
+                if left_at > since
+            ]
+
+
+tracker_history = TrackerHistory()
+
+
+def read_tracker(center_name):
+    """Reads a center's tracker rows and records who left since the last read.
+
+    Returns the rows and the epoch second of the read.
+    """
+    read_at = int(time.time())
+    rows = list(repository.execute(repository.CUSTOMER_TRACKER_QUERY, (center_name,)))
+    tracker_history.observe(
+        center_name, [row["global_identity"] for row in rows], read_at
+    )
+    return rows, read_at
+
+
+class LiveFeed:
+    """Polls the tracker of the centers that have subscribers.
+
+    Each subscriber gets a snapshot first and deltas afterwards. A subscriber
+    too slow to drain its queue is sent a fresh snapshot instead.
+    """
+
+    def __init__(self, interval=LIVE_FEED_INTERVAL):
+        self.interval = interval
+        # center_name -> {subscriber queue: whether it still needs a snapshot}
+        self._subscribers = {}
+        self._states = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self, center_name):
+        subscriber = queue.Queue(LIVE_FEED_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(center_name, {})[subscriber] = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="live-feed", daemon=True
+                )
+                self._thread.start()
+        # Send the first snapshot without waiting for the next tick
+        self._wake.set()
+        return subscriber
+
+    def unsubscribe(self, center_name, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(center_name, {})
+            subscribers.pop(subscriber, None)
+            if not subscribers:
+                self._subscribers.pop(center_name, None)
+                self._states.pop(center_name, None)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                center_names = list(self._subscribers)
+            for center_name in center_names:
+                try:
+                    rows, _ = read_tracker(center_name)
+                    self._publish(center_name, tracker_state(rows))
+                except Exception:
+                    logging.exception(f"Live feed of {center_name} failed")
+
+    def _publish(self, center_name, state):
+        with self._lock:
+            subscribers = self._subscribers.get(center_name)
+            if not subscribers:
+                return
+            old_state = self._states.get(center_name)
+            self._states[center_name] = state
+            delta = None if old_state is None else state_delta(old_state, state)
+
+            for subscriber, needs_snapshot in subscribers.items():
+                if needs_snapshot or old_state is None:
+                    event = ("snapshot", state_snapshot(state))
+                elif delta is not None:
+                    event = ("delta", delta)
+                else:
+                    continue
+                try:
+                    subscriber.put_nowait(event)
+                    subscribers[subscriber] = False
+                except queue.Full:
+                    subscribers[subscriber] = True
+                    _drain(subscriber)
+
+
+def _drain(subscriber):
+    try:
+        while True:
+            subscriber.get_nowait()
+    except queue.Empty:
+        pass
+
+
+live_feed = LiveFeed()
+
+
+stream_slots = threading.BoundedSemaphore(LIVE_FEED_MAX_STREAMS)
+
+
+def _feed_events(center_name):
+    subscriber = live_feed.subscribe(center_name)
+    try:
+        while True:
+            try:
+                event, data = subscriber.get(timeout=LIVE_FEED_KEEPALIVE)
+            except queue.Empty:
+                # Lets a disconnected client be noticed
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    finally:
+        live_feed.unsubscribe(center_name, subscriber)
+
+
+class FeedStream:
+    """The Server-Sent Events of a center's live feed, until disconnected.
+
+    Holds one of the process' stream slots until the server closes it, which
+    happens even when the stream was never iterated.
+    """
+
+    def __init__(self, center_name):
+        self._events = _feed_events(center_name)
+        self._closed = False
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._events.close()
+        stream_slots.release()
+
+
+def feed_events(center_name):
+    """Opens a FeedStream, None when LIVE_FEED_MAX_STREAMS are already open."""
+    if not stream_slots.acquire(blocking=False):
+        return None
+    return FeedStream(center_name)
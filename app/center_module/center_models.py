@@ -37,3 +37,26 @@ class Areas(Model):
     area_name = columns.Text(primary_key=True, required=True)
     polygon = columns.Bytes(required=True)
     highlight_on_customers = columns.Text()
+
+
+class ReportJob(Model):
+    __options__ = {
+        "compaction": {
+            "class": "LeveledCompactionStrategy",
+            "sstable_size_in_mb": "64",
+            "tombstone_threshold": ".2",
+        },
+        "comment": "Background report jobs and their results, written with a TTL",
+    }
+    __keyspace__ = "cja_data"
+    job_id = columns.UUID(primary_key=True, required=True)
+    center_name = columns.Text(required=True)
+    from_time = columns.Float(required=True)
+    to_time = columns.Float(required=True)
+    status = columns.Text(required=True)
+    progress = columns.Float(required=True)
+    submitted_at = columns.BigInt(required=True)
+    finished_at = columns.BigInt()
+    error = columns.Text()
+    # JSON of the report once done
+    result = columns.Text()
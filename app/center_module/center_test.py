@@ -1,7 +1,9 @@
 import pytest
 import json
 import requests
+import time
 from app.utils import test_base_url, BAD_REQUEST, OK, get_request_fn
+from app.timeline_module.timeline_models import CustomerTracker
 
 pytestmark = pytest.mark.asyncio
 
@@ -211,8 +213,32 @@ async def test_zone_management(method, params, expected_response):
     [
         # good request
         ({"center": "Headquarters", "from_time": 1000, "to_time": 2000,}, OK),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "since": 0,
+            },
+            OK,
+        ),
         # bad request
         ({"center": "WrongName", "from_time": 2000, "to_time": 1000,}, BAD_REQUEST),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "since": "Wrong",
+            },
+            BAD_REQUEST,
+        ),
+        (
+            {"center": "Headquarters", "from_time": 1000, "to_time": 2000, "since": 0},
+            BAD_REQUEST,
+        ),
         ({}, BAD_REQUEST),
     ],
 )
@@ -295,6 +321,81 @@ async def test_happiness_per_area(params, expected_response):
             },
             BAD_REQUEST,
         ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "page_size": 1,
+                "cursor": "",
+            },
+            OK,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "page_size": 1,
+                "cursor": "Wrong Cursor",
+            },
+            BAD_REQUEST,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "page": 0,
+                "page_size": 1,
+                "cursor": "",
+            },
+            BAD_REQUEST,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "since": 0,
+            },
+            OK,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "since": "Wrong",
+            },
+            BAD_REQUEST,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": False,
+                "since": 0,
+            },
+            BAD_REQUEST,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "page_size": 1,
+                "since": 0,
+            },
+            BAD_REQUEST,
+        ),
         ({}, BAD_REQUEST),
     ],
 )
@@ -303,6 +404,86 @@ async def test_customers_list(params, expected_response):
     assert r.status_code == expected_response
 
 
+async def test_customers_list_cursor():
+    window = {
+        "center": "Headquarters",
+        "from_time": 1586217600,
+        "to_time": 1593590400,
+        "live": False,
+        "page_size": 1,
+    }
+    r = requests.get(f"{base_url}/customers", params={**window, "cursor": ""})
+    assert r.status_code == OK
+    page = r.json()
+    assert page["next_cursor"] is not None
+    cursor_ids = [customer["id"] for customer in page["customers"]]
+    while page["next_cursor"] is not None:
+        params = {**window, "cursor": page["next_cursor"]}
+        r = requests.get(f"{base_url}/customers", params=params)
+        assert r.status_code == OK
+        page = r.json()
+        cursor_ids += [customer["id"] for customer in page["customers"]]
+
+    r = requests.get(f"{base_url}/customers", params={**window, "page": 0})
+    assert r.status_code == OK
+    total_pages = r.json()["total_pages"]
+    page_ids = [customer["id"] for customer in r.json()["customers"]]
+    for page_number in range(1, total_pages):
+        params = {**window, "page": page_number}
+        r = requests.get(f"{base_url}/customers", params=params)
+        assert r.status_code == OK
+        page_ids += [customer["id"] for customer in r.json()["customers"]]
+    assert cursor_ids == page_ids
+
+
+async def test_customers_list_since():
+    params = {
+        "center": "Headquarters",
+        "from_time": 1000,
+        "to_time": 2000,
+        "live": True,
+        "since": 0,
+    }
+    r = requests.get(f"{base_url}/customers", params=params)
+    assert r.status_code == OK
+    params["since"] = r.json()["until"]
+    r = requests.get(f"{base_url}/customers", params=params)
+    assert r.status_code == OK
+    assert r.json()["since"] == params["since"]
+
+
+async def test_area_statistics_since_lagged_row():
+    params = {
+        "center": "Headquarters",
+        "from_time": 1000,
+        "to_time": 2000,
+        "live": True,
+        "since": 0,
+    }
+    r = requests.get(f"{base_url}/area_statistics", params=params)
+    assert r.status_code == OK
+    params["since"] = r.json()["until"]
+    # Written after that read but stamped before it, as ingest lag does
+    CustomerTracker.create(
+        center_name="Headquarters",
+        global_identity="C-LAGGED",
+        area="Main Entrance",
+        area_type="Entry",
+        epoch_second=params["since"] - 5,
+        position_x=0,
+        position_y=0,
+    )
+    try:
+        r = requests.get(f"{base_url}/area_statistics", params=params)
+        assert r.status_code == OK
+        customers = [customer["global_identity"] for customer in r.json()["customers"]]
+        assert "C-LAGGED" in customers
+    finally:
+        CustomerTracker.objects(
+            center_name="Headquarters", global_identity="C-LAGGED"
+        ).delete()
+
+
 @pytest.mark.parametrize(
     "params, expected_response",
     [
@@ -316,6 +497,16 @@ async def test_customers_list(params, expected_response):
             },
             OK,
         ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": True,
+                "since": 0,
+            },
+            OK,
+        ),
         # bad request
         (
             {
@@ -327,6 +518,16 @@ async def test_customers_list(params, expected_response):
             },
             BAD_REQUEST,
         ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "live": False,
+                "since": 0,
+            },
+            BAD_REQUEST,
+        ),
         (
             {"center": "WrongName", "from_time": 2000, "to_time": 1000, "live": True},
             BAD_REQUEST,
@@ -354,6 +555,15 @@ async def test_area_statistics(params, expected_response):
             },
             OK,
         ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "align": "day",
+            },
+            OK,
+        ),
         # bad request
         (
             {
@@ -407,4 +617,89 @@ async def test_area_statistics(params, expected_response):
 )
 async def test_customer_journey(params, expected_response):
     r = requests.get(f"{base_url}/customer_journey", params=params)
-    assert r.status_code == expected_response
\ No newline at end of file
+    assert r.status_code == expected_response
+
+
+@pytest.mark.parametrize(
+    "params, expected_response",
+    [
+        ({"center": "Headquarters", "from_time": 1000, "to_time": 2000}, OK),
+        (
+            {"center": "Headquarters", "from_time": 1586217600, "to_time": 1586476800},
+            OK,
+        ),
+        ({"center": "WrongName", "from_time": 1000, "to_time": 2000}, BAD_REQUEST),
+        ({"center": "Headquarters", "from_time": 2000, "to_time": 1000}, BAD_REQUEST),
+        ({"center": "Headquarters", "from_time": "Wrong Time"}, BAD_REQUEST),
+        ({}, BAD_REQUEST),
+    ],
+)
+async def test_generate_report(params, expected_response):
+    r = requests.get(f"{base_url}/generate_report", params=params)
+    assert r.status_code == expected_response
+
+
+@pytest.mark.parametrize(
+    "params, expected_response",
+    [
+        ({"center": "Headquarters", "from_time": 1000, "to_time": 2000}, OK),
+        ({"center": "WrongName", "from_time": 1000, "to_time": 2000}, BAD_REQUEST),
+        ({"center": "Headquarters", "from_time": 2000, "to_time": 1000}, BAD_REQUEST),
+        ({"center": "Headquarters", "from_time": "Wrong Time"}, BAD_REQUEST),
+        ({}, BAD_REQUEST),
+    ],
+)
+async def test_submit_report_job(params, expected_response):
+    r = requests.post(f"{base_url}/report_jobs", params=params)
+    assert r.status_code == expected_response
+
+
+@pytest.mark.parametrize(
+    "job_id, expected_response",
+    [
+        ("00000000-0000-0000-0000-000000000000", BAD_REQUEST),
+        ("Wrong Job", BAD_REQUEST),
+    ],
+)
+async def test_report_job_status(job_id, expected_response):
+    r = requests.get(f"{base_url}/report_jobs/{job_id}")
+    assert r.status_code == expected_response
+    r = requests.get(f"{base_url}/report_jobs/{job_id}/result")
+    assert r.status_code == expected_response
+
+
+async def test_report_job_result():
+    params = {"center": "Headquarters", "from_time": 1586217600, "to_time": 1586476800}
+    r = requests.post(f"{base_url}/report_jobs", params=params)
+    assert r.status_code == OK
+    job_id = r.json()["job_id"]
+
+    for _ in range(60):
+        r = requests.get(f"{base_url}/report_jobs/{job_id}")
+        assert r.status_code == OK
+        if r.json()["status"] in ["done", "failed"]:
+            break
+        time.sleep(1)
+    assert r.json()["status"] == "done"
+
+    r = requests.get(f"{base_url}/report_jobs/{job_id}/result")
+    assert r.status_code == OK
+    assert "hx_index" in r.json()
+
+
+@pytest.mark.parametrize(
+    "params, expected_response",
+    [
+        ({"center": "Headquarters"}, OK),
+        ({"center": "WrongName"}, BAD_REQUEST),
+        ({}, BAD_REQUEST),
+    ],
+)
+async def test_live_feed(params, expected_response):
+    with requests.get(
+        f"{base_url}/live_feed", params=params, stream=True, timeout=30
+    ) as r:
+        assert r.status_code == expected_response
+        if r.status_code == OK:
+            assert r.headers["Content-Type"].startswith("text/event-stream")
+            assert next(r.iter_lines(decode_unicode=True)) == "event: snapshot"
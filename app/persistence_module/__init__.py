@@ -2,9 +2,16 @@ from cassandra.cqlengine.management import sync_table, create_keyspace_simple
 from cassandra.cqlengine import connection
 from cassandra.query import dict_factory
 from cassandra.auth import PlainTextAuthProvider
-from app.center_module.center_models import Center, Areas
+from app.center_module.center_models import Center, Areas, ReportJob
+from .repository import (
+    CUSTOMER_TIMELINE_WINDOW_QUERY,
+    prepare_statements,
+    execute,
+    select_columns,
+)
 import logging
 import cassandra
+import pandas as pd
 import os
 import time
 import json
@@ -20,7 +27,35 @@ from app.user_module.user_models import (
 )
 
 from app.calibration_module.calibration_models import Calibration
-from app.timeline_module.timeline_models import Timeline, CustomerTracker, DwellTime
+from app.timeline_module.timeline_reader import read_timeline_pages
+from app.timeline_module.timeline_models import (
+    Timeline,
+    TimelineByCustomer,
+    TimelineByDay,
+    FaceCrop,
+    HistoryRollup,
+    RollupWatermark,
+    HeatmapTile,
+    AttendanceSketch,
+    JourneyNgram,
+    CustomerTracker,
+    DwellTime,
+)
+
+
+def page_factory(colnames, rows):
+    """Row factory that keeps each result page as a single (colnames, rows) item."""
+    return [(colnames, rows)]
+
+
+def pages_to_frame(pages, columns):
+    """Builds a DataFrame column by column from (colnames, rows) pages."""
+    data = {column: [] for column in columns}
+    for colnames, rows in pages:
+        for column, values in zip(colnames, zip(*rows)):
+            if column in data:
+                data[column].extend(values)
+    return pd.DataFrame(data, columns=columns)
 
 
 class Persistence:
@@ -54,20 +89,61 @@ class Persistence:
         connection.get_session().row_factory = dict_factory
 
         self.connection = connection.get_session()
+        self.columnar_connection = connection.get_cluster().connect()
+        self.columnar_connection.row_factory = page_factory
 
     def create_schema(self):
         create_keyspace_simple(name="cja_metadata", replication_factor=1)
         create_keyspace_simple(name="cja_data", replication_factor=1)
         sync_table(Center)
         sync_table(Areas)
+        sync_table(ReportJob)
         sync_table(User)
         sync_table(UsersByLocation)
         sync_table(WorkingHours)
         sync_table(UserStatus)
         sync_table(Language)
         sync_table(Timeline)
+        sync_table(TimelineByCustomer)
+        sync_table(TimelineByDay)
+        sync_table(FaceCrop)
+        sync_table(HistoryRollup)
+        sync_table(RollupWatermark)
+        sync_table(HeatmapTile)
+        sync_table(AttendanceSketch)
+        sync_table(JourneyNgram)
         sync_table(CustomerTracker)
         sync_table(Calibration)
         sync_table(DwellTime)
+        prepare_statements()
 
         return self
+
+    def read_frame(self, query, parameters, columns):
+        """Runs a prepared query and returns its rows as a DataFrame."""
+        pages = execute(query, parameters, self.columnar_connection)
+        return pages_to_frame(pages, columns)
+
+    def read_timeline_frame(self, center_names, from_time, to_time, columns):
+        """Reads a bucketed Timeline window straight into a DataFrame.
+
+        Frames are in epoch_second order, like read_timeline_window.
+        """
+        pages = read_timeline_pages(
+            center_names, from_time, to_time, columns, self.columnar_connection
+        )
+        df_db = pages_to_frame(pages, columns)
+        if not isinstance(center_names, str) and len(center_names) > 1:
+            df_db = df_db.sort_values("epoch_second", kind="mergesort")
+            df_db = df_db.reset_index(drop=True)
+        return df_db
+
+    def read_customer_timeline_frame(
+        self, center_name, global_identity, from_time, to_time, columns
+    ):
+        """Reads the frames of one customer within a time window into a DataFrame."""
+        return self.read_frame(
+            CUSTOMER_TIMELINE_WINDOW_QUERY.format(columns=select_columns(columns)),
+            (center_name, global_identity, int(from_time), int(to_time)),
+            columns,
+        )
@@ -0,0 +1,130 @@
+from cassandra.cqlengine import connection
+from cassandra.cqlengine.query import DoesNotExist
+
+CENTER_QUERY = "SELECT * FROM cja_data.center WHERE name = ?"
+CENTER_NAMES_QUERY = "SELECT name FROM cja_data.center"
+CUSTOMER_TIMELINE_QUERY = (
+    "SELECT {columns} FROM cja_data.timeline_by_customer "
+    "WHERE center_name = ? AND global_identity = ? AND epoch_second >= ?"
+)
+CUSTOMER_TIMELINE_WINDOW_QUERY = CUSTOMER_TIMELINE_QUERY + " AND epoch_second <= ?"
+TIMELINE_WINDOW_QUERY = (
+    "SELECT {columns} FROM cja_data.timeline_by_day "
+    "WHERE center_name = ? AND day_bucket = ? "
+    "AND epoch_second >= ? AND epoch_second <= ?"
+)
+CUSTOMER_TRACKER_QUERY = "SELECT * FROM cja_data.customer_tracker WHERE center_name = ?"
+FACE_CROP_QUERY = (
+    "SELECT epoch_second, face_crop FROM cja_data.face_crop "
+    "WHERE center_name = ? AND global_identity = ? AND epoch_second = ?"
+)
+DWELL_TIME_QUERY = (
+    "SELECT area, dwell_time FROM cja_data.dwell_time "
+    "WHERE center_name = ? AND global_identity = ? AND area IN ? "
+    "AND epoch_second > ? AND epoch_second < ?"
+)
+HISTORY_ROLLUP_QUERY = (
+    "SELECT bucket_start, dimension, dimension_value, frames, happiness_sum "
+    "FROM cja_data.history_rollup WHERE center_name = ? AND granularity = ? "
+    "AND bucket_start >= ? AND bucket_start < ?"
+)
+HEATMAP_TILE_QUERY = (
+    "SELECT hour_start, cells FROM cja_data.heatmap_tile "
+    "WHERE center_name = ? AND cell_size = ? "
+    "AND hour_start >= ? AND hour_start < ?"
+)
+ATTENDANCE_SKETCH_QUERY = (
+    "SELECT category, registers FROM cja_data.attendance_sketch "
+    "WHERE center_name = ? AND day_bucket = ? "
+    "AND hour_start >= ? AND hour_start <= ?"
+)
+JOURNEY_NGRAM_QUERY = (
+    "SELECT journey, customers FROM cja_data.journey_ngram "
+    "WHERE center_name = ? AND n = ? AND day_bucket >= ? AND day_bucket < ?"
+)
+ROLLUP_WATERMARK_QUERY = (
+    "SELECT from_epoch_second, epoch_second FROM cja_data.rollup_watermark "
+    "WHERE center_name = ? AND rollup = ?"
+)
+
+HOT_QUERIES = [
+    CENTER_QUERY,
+    CENTER_NAMES_QUERY,
+    CUSTOMER_TIMELINE_QUERY.format(columns="*"),
+    CUSTOMER_TIMELINE_WINDOW_QUERY.format(columns="*"),
+    TIMELINE_WINDOW_QUERY.format(columns="*"),
+    CUSTOMER_TRACKER_QUERY,
+    FACE_CROP_QUERY,
+    DWELL_TIME_QUERY,
+    HISTORY_ROLLUP_QUERY,
+    HEATMAP_TILE_QUERY,
+    ATTENDANCE_SKETCH_QUERY,
+    JOURNEY_NGRAM_QUERY,
+    ROLLUP_WATERMARK_QUERY,
+]
+
+_prepared_statements = {}
+
+
+def prepare(query):
+    """Returns the prepared statement for a query, preparing it on first use."""
+    statement = _prepared_statements.get(query)
+    if statement is None:
+        statement = connection.get_session().prepare(query)
+        _prepared_statements[query] = statement
+    return statement
+
+
+def prepare_statements(queries=HOT_QUERIES):
+    for query in queries:
+        prepare(query)
+
+
+def execute(query, parameters=None, session=None):
+    session = session or connection.get_session()
+    return session.execute(prepare(query), parameters)
+
+
+def execute_async(query, parameters=None, session=None):
+    """Runs a prepared query, on another session of the cluster if given."""
+    session = session or connection.get_session()
+    return session.execute_async(prepare(query), parameters)
+
+
+def select_columns(columns=None):
+    if columns is None:
+        return "*"
+    return ", ".join(columns)
+
+
+def get_center(name):
+    """Returns the center row as a dict.
+
+    Raises DoesNotExist like cqlengine's .get() so callers keep their handlers.
+    """
+    center = execute(CENTER_QUERY, (name,)).one()
+    if center is None:
+        raise DoesNotExist(f"Center {name} not found")
+    return center
+
+
+def get_center_names():
+    return [center["name"] for center in execute(CENTER_NAMES_QUERY)]
+
+
+def get_rollup_watermark(center_name, rollup):
+    """Returns the [from_epoch_second, epoch_second) range a rollup covers, or None."""
+    return execute(ROLLUP_WATERMARK_QUERY, (center_name, rollup)).one()
+
+
+def read_customer_timeline(
+    center_name, global_identity, from_time, to_time=None, columns=None
+):
+    """Returns the frames of one customer from from_time onwards, in epoch order."""
+    if to_time is None:
+        query = CUSTOMER_TIMELINE_QUERY.format(columns=select_columns(columns))
+        parameters = (center_name, global_identity, int(from_time))
+    else:
+        query = CUSTOMER_TIMELINE_WINDOW_QUERY.format(columns=select_columns(columns))
+        parameters = (center_name, global_identity, int(from_time), int(to_time))
+    return list(execute(query, parameters))
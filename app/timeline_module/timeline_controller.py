@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify, abort, Response, make_response
 from .timeline_facade import TimelineFacade
+from .timeline_utils import default_heatmap_cell_size, default_journey_length
 from app.auth_tools import protected_endpoint
 from app import auto
-from app.utils import EMPTY_REQUEST, INVALID_FORMAT
+from app.utils import EMPTY_REQUEST, INVALID_FORMAT, align_window, window_headers
+import click
 
 timeline_controller = Blueprint("timeline", __name__, url_prefix="/api/v1/timeline")
 
@@ -145,6 +147,8 @@ def get_history(role):
         "history_type": "happiness", ("happiness" or "attendance)
         "from_time": 1591106400, (timestamp in seconds)
         "end_time": 1591110470, (timestamp in seconds)
+        "align": "hour", (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
         "time_interval": 60, (Frames of time in which the aggregations are made)
     }
 
@@ -171,12 +175,14 @@ def get_history(role):
             from_time = float(request.args.get("from_time"))
             to_time = float(request.args.get("to_time"))
             time_interval = float(request.args.get("time_interval"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         response = TimelineFacade.get_history(
             center, history_type, from_time, to_time, time_interval, role,
         )
-        return jsonify(response)
+        return jsonify(response), window_headers(from_time, to_time, align)
 
 
 @timeline_controller.route("/journey-summary", methods=["GET"])
@@ -195,6 +201,8 @@ def journey_summary(role):
         "center": "Headquarters", (The employee's center's name)
         "from_time": 1591106400, (timestamp in seconds)
         "to_time": 1591110470, (timestamp in seconds)
+        "align": "hour", (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
     }
 
     Returns {
@@ -239,10 +247,12 @@ def journey_summary(role):
         try:
             from_time = float(request.args.get("from_time"))
             to_time = float(request.args.get("to_time"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         resp = TimelineFacade.get_journey_summary(center, from_time, to_time)
-        return jsonify(resp)
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @timeline_controller.route("/most-traveled-journeys", methods=["GET"])
@@ -261,9 +271,12 @@ def most_traveled_journeys(role):
         "center": "Headquarters", (The employee's center's name)
         "from_time": 1591106400, (timestamp in seconds)
         "to_time": 1591110470, (timestamp in seconds)
+        "align": "hour", (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
+        "n": 3, (Optional, number of consecutive areas in a journey)
     }
 
-    Returns an array of JourneyUsage [
+    Returns an array of JourneyUsage, most traveled first [
       {
         "journey": [
           {
@@ -293,10 +306,13 @@ def most_traveled_journeys(role):
         try:
             from_time = int(request.args.get("from_time"))
             to_time = int(request.args.get("to_time"))
+            align = request.args.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
+            n = int(request.args.get("n", default_journey_length))
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
-        resp = TimelineFacade.get_most_traveled_journey(center, from_time, to_time)
-        return jsonify(resp)
+        resp = TimelineFacade.get_most_traveled_journey(center, from_time, to_time, n)
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @timeline_controller.route("/position_heatmap", methods=["GET"])
@@ -315,6 +331,9 @@ def get_position_heatmap():
         "center": "Headquarters", (The employee's center's name)
         "from_time": 1591106400, (timestamp in seconds)
         "to_time": 1591110470, (timestamp in seconds)
+        "align": "hour", (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
+        "cell_size": 50, (Optional, side in pixels of the aggregation squares)
     }
 
     Returns {
@@ -335,10 +354,15 @@ def get_position_heatmap():
         try:
             from_time = float(data.get("from_time"))
             to_time = float(data.get("to_time"))
+            align = data.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
+            cell_size = int(data.get("cell_size", default_heatmap_cell_size))
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
-        resp = TimelineFacade.get_heatmap(center, from_time, to_time)
-        return jsonify(resp)
+        resp = TimelineFacade.get_heatmap(
+            center, from_time, to_time, cell_size=cell_size
+        )
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @timeline_controller.route("/customer_position_heatmap", methods=["GET"])
@@ -357,7 +381,10 @@ def get_customer_position_heatmap():
         "center": "Headquarters", (The employee's center's name)
         "from_time": 1591106400, (timestamp in seconds)
         "to_time": 1591110470, (timestamp in seconds)
+        "align": "hour", (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
         "global_identity": C-001, (Customer ID)
+        "cell_size": 50, (Optional, side in pixels of the aggregation squares)
     }
 
     Returns {
@@ -378,11 +405,16 @@ def get_customer_position_heatmap():
         try:
             from_time = float(data.get("from_time"))
             to_time = float(data.get("to_time"))
+            align = data.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
             global_identity = data.get("global_identity")
+            cell_size = int(data.get("cell_size", default_heatmap_cell_size))
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
-        resp = TimelineFacade.get_heatmap(center, from_time, to_time, global_identity)
-        return jsonify(resp)
+        resp = TimelineFacade.get_heatmap(
+            center, from_time, to_time, global_identity, cell_size
+        )
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @timeline_controller.route("/position_dwell_heatmap", methods=["GET"])
@@ -401,6 +433,8 @@ def get_position_dwell_heatmap():
         "center": "Headquarters", (The employee's center's name)
         "from_time": 1591106400, (timestamp in seconds)
         "to_time": 1591110470, (timestamp in seconds)
+        "align": "hour", (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
     }
 
     Returns {
@@ -421,10 +455,12 @@ def get_position_dwell_heatmap():
         try:
             from_time = float(data.get("from_time"))
             to_time = float(data.get("to_time"))
+            align = data.get("align")
+            from_time, to_time = align_window(from_time, to_time, align)
         except (ValueError, TypeError):
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         resp = TimelineFacade.get_dwell_heatmap(center, from_time, to_time)
-        return jsonify(resp)
+        return jsonify(resp), window_headers(from_time, to_time, align)
 
 
 @timeline_controller.route("/historic_attendance", methods=["GET"])
@@ -444,6 +480,9 @@ def get_historic_attendance():
         "center": "Headquarters", (The employee's center's name)
         "from_time": 1591106400, (timestamp in seconds)
         "to_time": 1591110470, (timestamp in seconds)
+        "align": "hour", (Optional, "minute", "hour" or "day". Widens the window to
+          whole ones, reported in the X-Window-From and X-Window-To headers)
+        "approximate": false, (Optional, HyperLogLog estimates for long ranges)
     }
 
     Returns {
@@ -461,8 +500,96 @@ def get_historic_attendance():
     try:
         from_time = int(request.args.get("from_time"))
         to_time = int(request.args.get("to_time"))
+        align = request.args.get("align")
+        from_time, to_time = align_window(from_time, to_time, align)
+        approximate = str(request.args.get("approximate")).lower() == "true"
     except (ValueError, TypeError):
         abort(make_response(jsonify(error=INVALID_FORMAT), 400))
-    resp = TimelineFacade.get_historic_attendance(center, from_time, to_time)
-    return jsonify(resp)
-
+    resp = TimelineFacade.get_historic_attendance(
+        center, from_time, to_time, approximate
+    )
+    return jsonify(resp), window_headers(from_time, to_time, align)
+
+
+@timeline_controller.cli.command("backfill-by-customer")
+@click.option("--center", default=None, help="Only backfill this center")
+@click.option("--from-time", default=0, type=int, help="Epoch second to start from")
+def backfill_by_customer(center, from_time):
+    """Copies existing Timeline frames into the per-customer timeline table."""
+    copied_frames = TimelineFacade.backfill_customer_timeline(center, from_time)
+    click.echo(f"{copied_frames} frames copied")
+
+
+@timeline_controller.cli.command("backfill-by-day")
+@click.option("--center", default=None, help="Only backfill this center")
+@click.option("--from-time", default=0, type=int, help="Epoch second to start from")
+def backfill_by_day(center, from_time):
+    """Copies existing Timeline frames into the day-bucketed timeline table."""
+    copied_frames = TimelineFacade.backfill_day_timeline(center, from_time)
+    click.echo(f"{copied_frames} frames copied")
+
+
+@timeline_controller.cli.command("migrate-face-crops")
+@click.option("--center", default=None, help="Only migrate this center")
+@click.option("--from-time", default=0, type=int, help="Epoch second to start from")
+def migrate_face_crops(center, from_time):
+    """Moves face crops stored inline in Timeline rows to the crop store."""
+    migrated_frames = TimelineFacade.migrate_face_crops(center, from_time)
+    click.echo(f"{migrated_frames} face crops migrated")
+
+
+@timeline_controller.cli.command("rollup-history")
+@click.option("--center", default=None, help="Only roll up this center")
+@click.option(
+    "--granularity",
+    "granularities",
+    multiple=True,
+    type=int,
+    help="Bucket size in seconds, hourly and daily by default",
+)
+@click.option("--from-time", default=0, type=int, help="Epoch second of a first rollup")
+def rollup_history(center, granularities, from_time):
+    """Rolls complete buckets of new frames into the history rollup tables."""
+    written_rows = TimelineFacade.rollup_history(center, granularities, from_time)
+    click.echo(f"{written_rows} rollup rows written")
+
+
+@timeline_controller.cli.command("tile-heatmaps")
+@click.option("--center", default=None, help="Only tile this center")
+@click.option(
+    "--cell-size",
+    "cell_sizes",
+    multiple=True,
+    type=int,
+    help="Square size in pixels, the default heatmap cell size by default",
+)
+@click.option("--from-time", default=0, type=int, help="Epoch second of a first run")
+def tile_heatmaps(center, cell_sizes, from_time):
+    """Bins the positions of complete hours into the heatmap tiles table."""
+    written_tiles = TimelineFacade.tile_heatmaps(center, cell_sizes, from_time)
+    click.echo(f"{written_tiles} heatmap tiles written")
+
+
+@timeline_controller.cli.command("sketch-attendance")
+@click.option("--center", default=None, help="Only sketch this center")
+@click.option("--from-time", default=0, type=int, help="Epoch second of a first run")
+def sketch_attendance(center, from_time):
+    """Sketches the distinct customers of complete hours for approximate counts."""
+    written_sketches = TimelineFacade.sketch_attendance(center, from_time)
+    click.echo(f"{written_sketches} attendance sketches written")
+
+
+@timeline_controller.cli.command("count-journeys")
+@click.option("--center", default=None, help="Only count this center")
+@click.option(
+    "--n",
+    "lengths",
+    multiple=True,
+    type=int,
+    help="Number of consecutive areas, the default journey length by default",
+)
+@click.option("--from-time", default=0, type=int, help="Epoch second of a first run")
+def count_journeys(center, lengths, from_time):
+    """Counts the journey n-grams of complete days into the journey table."""
+    written_counts = TimelineFacade.count_journeys(center, lengths, from_time)
+    click.echo(f"{written_counts} journey counts written")
@@ -1,14 +1,67 @@
 from flask import abort, make_response, jsonify
-from app.center_module.center_models import Center
-from .timeline_models import Timeline, CustomerTracker, DwellTime
-from app.center_module.center_models import Areas
+from cassandra.cqlengine import connection
+from cassandra.cqlengine.query import BatchQuery
+from cassandra import InvalidRequest
+from cassandra.query import BatchStatement, SimpleStatement
+from .timeline_models import (
+    Timeline,
+    TimelineByCustomer,
+    TimelineByDay,
+    FaceCrop,
+    HistoryRollup,
+    RollupWatermark,
+    HeatmapTile,
+    AttendanceSketch,
+    JourneyNgram,
+    CustomerTracker,
+    DwellTime,
+)
+from .timeline_reader import (
+    SECONDS_IN_A_DAY,
+    day_bucket,
+    read_timeline_window,
+    read_face_crops,
+    read_attendance_sketches,
+)
+from .timeline_sketch import (
+    HyperLogLog,
+    attendance_columns,
+    sketch_frames,
+    merge_sketches,
+)
+from app.persistence_module import repository
+from app.cache_module import metadata_cache, single_flight, window_cache
+from app import db
+from .timeline_report import (
+    report_columns,
+    report_interval,
+    attendance_counts,
+    attendance_intervals,
+    waiting_time_chart,
+)
 from .timeline_utils import (
     history_type_values,
-    sortByArea,
+    default_heatmap_cell_size,
+    heatmap_columns,
+    heatmap_cells,
+    merge_heatmap_cells,
+    encode_heatmap_cells,
+    decode_heatmap_cells,
+    history_columns,
+    history_count_columns,
+    history_frames,
+    history_counts,
     stage_timeline_mapper,
     happiness_timeline_mapper,
     footage_timeline_mapper,
-    history_happiness_mapper,
+    history_records,
+    journey_summary_columns,
+    journey_summary,
+    journey_columns,
+    default_journey_length,
+    journey_ngram_counts,
+    encode_journey,
+    decode_journey,
 )
 from app.utils import (
     NULL_PARAMS,
@@ -17,31 +70,636 @@ from app.utils import (
     CENTER_NOT_FOUND,
     CUSTOMER_NOT_FOUND,
     create_area_mapper,
+    zone_labels,
 )
+from collections import Counter
+from itertools import groupby
 import base64
 import cassandra
+import hashlib
 import pandas as pd
-import numpy as np
-import cv2
 import json
+import math
+import numpy as np
+import time
+
+
+HISTORY_ROLLUP_GRANULARITIES = [SECONDS_IN_A_DAY, 60 * 60]
+HEATMAP_TILE_CELL_SIZES = [default_heatmap_cell_size]
+HEATMAP_TILE_GRANULARITY = 60 * 60
+ATTENDANCE_SKETCH_ROLLUP = "attendance_sketch"
+ATTENDANCE_SKETCH_GRANULARITY = 60 * 60
+JOURNEY_NGRAM_LENGTHS = [default_journey_length]
+# Scanning the window, then each of the five report sections
+REPORT_STEPS = 6
+# Buckets are only rolled up once frames stop arriving for them
+ROLLUP_DELAY = 5 * 60
+
+
+def _center_names(center_name=None):
+    if center_name is None:
+        return metadata_cache.get_center_names()
+    return [center_name]
+
+
+def history_rollup_name(granularity):
+    return f"history_{granularity}"
+
+
+def heatmap_rollup_name(cell_size):
+    return f"heatmap_{cell_size}"
+
+
+def journey_rollup_name(n):
+    return f"journey_{n}"
+
+
+def _rollup_chunks(center_name, rollup, granularity, from_time):
+    """Returns the first epoch a rollup covers and the windows it still lacks.
+
+    Windows are whole buckets that ended ROLLUP_DELAY ago, a day at most each so
+    that memory stays bounded.
+    """
+    watermark = repository.get_rollup_watermark(center_name, rollup)
+    if watermark is None:
+        rollup_from = int(from_time) // granularity * granularity
+        rollup_start = rollup_from
+    else:
+        rollup_from = watermark["from_epoch_second"]
+        rollup_start = watermark["epoch_second"]
+    rollup_end = (int(time.time()) - ROLLUP_DELAY) // granularity * granularity
+
+    chunk = max(granularity, SECONDS_IN_A_DAY)
+    return (
+        rollup_from,
+        [
+            (chunk_start, min(chunk_start + chunk, rollup_end))
+            for chunk_start in range(rollup_start, rollup_end, chunk)
+        ],
+    )
+
+
+def _rolled_up_window(center_name, rollup, granularity, start_time, end_time):
+    """Returns the [start, end) part of a window made of rolled up buckets.
+
+    None when the rollup covers no whole bucket of the window.
+    """
+    watermark = repository.get_rollup_watermark(center_name, rollup)
+    if watermark is None:
+        return None
+    rollup_start = max(
+        math.ceil(start_time / granularity) * granularity,
+        watermark["from_epoch_second"],
+    )
+    rollup_end = min(
+        (math.floor(end_time) + 1) // granularity * granularity,
+        watermark["epoch_second"],
+    )
+    if rollup_start >= rollup_end:
+        return None
+    return rollup_start, rollup_end
+
+
+def _raw_windows(start_time, end_time, rolled_up_window):
+    """Splits off the parts of a window outside its rolled up part."""
+    if rolled_up_window is None:
+        return [(start_time, end_time)]
+    rollup_start, rollup_end = rolled_up_window
+    return [
+        (from_time, to_time)
+        for from_time, to_time in [
+            (start_time, rollup_start - 1),
+            (rollup_end, end_time),
+        ]
+        if from_time <= to_time
+    ]
+
+
+def _history_counts(center_name, start_time, end_time, time_interval):
+    """Frame counts and happiness sums of one center's history window.
+
+    Whole buckets already rolled up are read from HistoryRollup when
+    time_interval is a multiple of a stored granularity; the rest of the window
+    is aggregated from the raw Timeline.
+    """
+    counts = []
+    rolled_up_window = None
+    granularity = next(
+        (
+            granularity
+            for granularity in HISTORY_ROLLUP_GRANULARITIES
+            if time_interval % granularity == 0
+        ),
+        None,
+    )
+    if granularity is not None:
+        rolled_up_window = _rolled_up_window(
+            center_name,
+            history_rollup_name(granularity),
+            granularity,
+            start_time,
+            end_time,
+        )
+    if rolled_up_window is not None:
+        df_rollup = db.read_frame(
+            repository.HISTORY_ROLLUP_QUERY,
+            (center_name, granularity) + rolled_up_window,
+            ["bucket_start", "dimension", "dimension_value", "frames", "happiness_sum"],
+        )
+        df_rollup["epoch_second_interval"] = (
+            df_rollup["bucket_start"] / time_interval
+        ).astype("int64")
+        counts.append(df_rollup[history_count_columns])
+
+    for from_time, to_time in _raw_windows(start_time, end_time, rolled_up_window):
+        df_db = db.read_timeline_frame(center_name, from_time, to_time, history_columns)
+        counts.append(history_counts(history_frames(df_db), time_interval))
+    return pd.concat(counts, ignore_index=True)
+
+
+def _heatmap_cells(center_name, from_time, to_time, cell_size):
+    """Counts the positions of one center's window per square of cell_size.
+
+    Whole hours already tiled at a cell size dividing cell_size are read from
+    HeatmapTile; the rest of the window is binned from the raw Timeline.
+    """
+    cells = []
+    counts = []
+    rolled_up_window = None
+    tile_cell_size = next(
+        (
+            tile_cell_size
+            for tile_cell_size in HEATMAP_TILE_CELL_SIZES
+            if cell_size % tile_cell_size == 0
+        ),
+        None,
+    )
+    if tile_cell_size is not None:
+        rolled_up_window = _rolled_up_window(
+            center_name,
+            heatmap_rollup_name(tile_cell_size),
+            HEATMAP_TILE_GRANULARITY,
+            from_time,
+            to_time,
+        )
+    if rolled_up_window is not None:
+        tiles = repository.execute(
+            repository.HEATMAP_TILE_QUERY,
+            (center_name, tile_cell_size) + rolled_up_window,
+        )
+        for tile in tiles:
+            tile_cells, tile_counts = decode_heatmap_cells(tile["cells"])
+            cells.append(np.floor_divide(tile_cells, cell_size // tile_cell_size))
+            counts.append(tile_counts)
+
+    for raw_from_time, raw_to_time in _raw_windows(
+        from_time, to_time, rolled_up_window
+    ):
+        df_db = db.read_timeline_frame(
+            center_name, raw_from_time, raw_to_time, heatmap_columns
+        )
+        raw_cells, raw_counts = heatmap_cells(df_db, cell_size)
+        cells.append(raw_cells)
+        counts.append(raw_counts)
+    return merge_heatmap_cells(cells, counts)
+
+
+def _daily_journey_counts(frames, n):
+    """Adds up the journey n-gram counts of each day of epoch ordered frames."""
+    counts = Counter()
+    for _, day_frames in groupby(
+        frames, key=lambda frame: day_bucket(frame["epoch_second"])
+    ):
+        counts.update(journey_ngram_counts(day_frames, n))
+    return counts
+
+
+def _journey_counts(center_name, from_time, to_time, n):
+    """Customers per day that went through each n-gram of areas, summed over a window.
+
+    Whole days already counted are read from JourneyNgram; the rest of the
+    window is counted from the raw Timeline.
+    """
+    counts = Counter()
+    rolled_up_window = _rolled_up_window(
+        center_name, journey_rollup_name(n), SECONDS_IN_A_DAY, from_time, to_time
+    )
+    if rolled_up_window is not None:
+        rollup_start, rollup_end = rolled_up_window
+        rows = repository.execute(
+            repository.JOURNEY_NGRAM_QUERY,
+            (center_name, n, day_bucket(rollup_start), day_bucket(rollup_end)),
+        )
+        for row in rows:
+            counts[decode_journey(row["journey"])] += row["customers"]
+
+    for raw_from_time, raw_to_time in _raw_windows(
+        from_time, to_time, rolled_up_window
+    ):
+        frames = read_timeline_window(
+            center_name, raw_from_time, raw_to_time, journey_columns
+        )
+        counts.update(_daily_journey_counts(frames, n))
+    return counts
+
+
+def _journey_usage(center_name, journey_counts):
+    """Maps journey n-gram counts to JourneyUsage entries, most traveled first."""
+    journey_counts = Counter(journey_counts)
+    num_of_clients = journey_counts.pop((), 0)
+    area_mapper = create_area_mapper(metadata_cache.get_areas(center_name))
+
+    # Journeys are split per day, a customer counts once a day
+    journey_usage = [
+        {
+            "journey": list(map(area_mapper, journey)),
+            "percent": customers / num_of_clients,
+        }
+        for journey, customers in journey_counts.items()
+    ]
+    journey_usage.sort(key=lambda entry: entry["percent"], reverse=True)
+    return journey_usage
 
 
 class TimelineFacade:
+    @staticmethod
+    def save_frame(frame):
+        """Writes a Timeline frame and its lookup copies in one logged batch.
+
+        A face_crop in the frame goes to the crop store and the frame only keeps
+        a reference to it.
+        """
+        frame = dict(frame)
+        face_crop = frame.pop("face_crop", None)
+        if face_crop is not None:
+            frame["crop_epoch_second"] = TimelineFacade.store_face_crop(
+                frame["center_name"],
+                frame["global_identity"],
+                frame["epoch_second"],
+                face_crop,
+            )
+
+        batch = BatchQuery()
+        Timeline.batch(batch).create(**frame)
+        TimelineByCustomer.batch(batch).create(**frame)
+        TimelineByDay.batch(batch).create(
+            day_bucket=day_bucket(frame["epoch_second"]), **frame
+        )
+        batch.execute()
+
+    @staticmethod
+    def store_face_crop(center_name, global_identity, epoch_second, face_crop):
+        """Stores a face crop unless it repeats the customer's previous one.
+
+        Returns the epoch_second of the FaceCrop row holding the image.
+        """
+        crop_hash = hashlib.sha1(face_crop).hexdigest()
+        previous_crop = (
+            FaceCrop.objects(
+                center_name=center_name,
+                global_identity=global_identity,
+                epoch_second__lte=int(epoch_second),
+            )
+            .order_by("-epoch_second")
+            .only(["epoch_second", "crop_hash"])
+            .limit(1)
+            .first()
+        )
+        if previous_crop is not None and previous_crop.crop_hash == crop_hash:
+            return previous_crop.epoch_second
+
+        FaceCrop.create(
+            center_name=center_name,
+            global_identity=global_identity,
+            epoch_second=int(epoch_second),
+            crop_hash=crop_hash,
+            face_crop=face_crop,
+        )
+        return int(epoch_second)
+
+    @staticmethod
+    def migrate_face_crops(center_name=None, from_time=0):
+        """Moves face crops still stored inline in Timeline rows to the crop store.
+
+        Returns the number of frames that got a crop reference.
+        """
+        session = connection.get_session()
+        try:
+            # The inline crop is dropped in the batch that adds its reference
+            move_crop = session.prepare(
+                "UPDATE cja_data.timeline SET crop_epoch_second = ?, face_crop = null "
+                "WHERE center_name = ? AND epoch_second = ? AND global_identity = ?"
+            )
+        except InvalidRequest:
+            # Installs created after face_crop left Timeline have nothing to move
+            return 0
+        reference_by_customer = session.prepare(
+            "UPDATE cja_data.timeline_by_customer SET crop_epoch_second = ? "
+            "WHERE center_name = ? AND global_identity = ? AND epoch_second = ?"
+        )
+        reference_by_day = session.prepare(
+            "UPDATE cja_data.timeline_by_day SET crop_epoch_second = ? "
+            "WHERE center_name = ? AND day_bucket = ? AND epoch_second = ? "
+            "AND global_identity = ?"
+        )
+
+        migrated_frames = 0
+        for name in _center_names(center_name):
+            legacy_frames = session.execute(
+                SimpleStatement(
+                    "SELECT epoch_second, global_identity, face_crop "
+                    "FROM cja_data.timeline "
+                    "WHERE center_name = %s AND epoch_second >= %s",
+                    fetch_size=1000,
+                ),
+                (name, int(from_time)),
+            )
+            for frame in legacy_frames:
+                if frame["face_crop"] is None:
+                    continue
+                crop_epoch_second = TimelineFacade.store_face_crop(
+                    name,
+                    frame["global_identity"],
+                    frame["epoch_second"],
+                    frame["face_crop"],
+                )
+                epoch_second = frame["epoch_second"]
+                global_identity = frame["global_identity"]
+                batch = BatchStatement()
+                batch.add(
+                    move_crop, (crop_epoch_second, name, epoch_second, global_identity)
+                )
+                batch.add(
+                    reference_by_customer,
+                    (crop_epoch_second, name, global_identity, epoch_second),
+                )
+                batch.add(
+                    reference_by_day,
+                    (
+                        crop_epoch_second,
+                        name,
+                        day_bucket(epoch_second),
+                        epoch_second,
+                        global_identity,
+                    ),
+                )
+                session.execute(batch)
+                migrated_frames += 1
+        return migrated_frames
+
+    @staticmethod
+    def stored_frames(center_name=None, from_time=0):
+        """Iterates the Timeline frames already stored for one or every center."""
+        for name in _center_names(center_name):
+            frames = Timeline.objects(
+                center_name=name, epoch_second__gte=int(from_time)
+            ).all()
+            for frame in frames:
+                yield dict(frame)
+
+    @staticmethod
+    def backfill_customer_timeline(center_name=None, from_time=0):
+        """Copies existing Timeline frames into TimelineByCustomer.
+
+        Returns the number of frames copied.
+        """
+        copied_frames = 0
+        for frame in TimelineFacade.stored_frames(center_name, from_time):
+            TimelineByCustomer.create(**frame)
+            copied_frames += 1
+        return copied_frames
+
+    @staticmethod
+    def backfill_day_timeline(center_name=None, from_time=0):
+        """Copies existing Timeline frames into TimelineByDay.
+
+        Returns the number of frames copied.
+        """
+        copied_frames = 0
+        for frame in TimelineFacade.stored_frames(center_name, from_time):
+            TimelineByDay.create(day_bucket=day_bucket(frame["epoch_second"]), **frame)
+            copied_frames += 1
+        return copied_frames
+
+    @staticmethod
+    def rollup_history(center_name=None, granularities=None, from_time=0):
+        """Rolls the history counts of new complete buckets into HistoryRollup.
+
+        Each center and granularity continues from its RollupWatermark, or starts
+        at from_time the first time. Returns the number of rollup rows written.
+        """
+        granularities = granularities or HISTORY_ROLLUP_GRANULARITIES
+        written_rows = 0
+        for name in _center_names(center_name):
+            for granularity in granularities:
+                rollup = history_rollup_name(granularity)
+                rollup_from, chunks = _rollup_chunks(
+                    name, rollup, granularity, from_time
+                )
+                for chunk_start, chunk_end in chunks:
+                    df_db = db.read_timeline_frame(
+                        name, chunk_start, chunk_end - 1, history_columns
+                    )
+                    df_counts = history_counts(history_frames(df_db), granularity)
+
+                    batch = BatchQuery()
+                    for row in df_counts.itertuples(index=False):
+                        HistoryRollup.batch(batch).create(
+                            center_name=name,
+                            granularity=granularity,
+                            bucket_start=int(row.epoch_second_interval) * granularity,
+                            dimension=row.dimension,
+                            dimension_value=row.dimension_value,
+                            frames=int(row.frames),
+                            happiness_sum=int(row.happiness_sum),
+                        )
+                    RollupWatermark.batch(batch).create(
+                        center_name=name,
+                        rollup=rollup,
+                        from_epoch_second=rollup_from,
+                        epoch_second=chunk_end,
+                    )
+                    batch.execute()
+                    written_rows += len(df_counts)
+        return written_rows
+
+    @staticmethod
+    def tile_heatmaps(center_name=None, cell_sizes=None, from_time=0):
+        """Bins the positions of new complete hours into HeatmapTile.
+
+        Each center and cell size continues from its RollupWatermark, or starts
+        at from_time the first time. Returns the number of tiles written.
+        """
+        cell_sizes = cell_sizes or HEATMAP_TILE_CELL_SIZES
+        written_tiles = 0
+        for name in _center_names(center_name):
+            for cell_size in cell_sizes:
+                rollup = heatmap_rollup_name(cell_size)
+                rollup_from, chunks = _rollup_chunks(
+                    name, rollup, HEATMAP_TILE_GRANULARITY, from_time
+                )
+                for chunk_start, chunk_end in chunks:
+                    df_db = db.read_timeline_frame(
+                        name,
+                        chunk_start,
+                        chunk_end - 1,
+                        ["epoch_second"] + heatmap_columns,
+                    )
+                    hours = (
+                        df_db["epoch_second"] // HEATMAP_TILE_GRANULARITY
+                    ) * HEATMAP_TILE_GRANULARITY
+
+                    # Tiles are too large to share a batch, rewriting them is
+                    # harmless if the watermark does not make it
+                    for hour_start, df_hour in df_db.groupby(hours):
+                        tile_cells, tile_counts = heatmap_cells(df_hour, cell_size)
+                        if len(tile_counts) <= 0:
+                            continue
+                        HeatmapTile.create(
+                            center_name=name,
+                            cell_size=cell_size,
+                            hour_start=int(hour_start),
+                            cells=encode_heatmap_cells(tile_cells, tile_counts),
+                        )
+                        written_tiles += 1
+                    RollupWatermark.create(
+                        center_name=name,
+                        rollup=rollup,
+                        from_epoch_second=rollup_from,
+                        epoch_second=chunk_end,
+                    )
+        return written_tiles
+
+    @staticmethod
+    def sketch_attendance(center_name=None, from_time=0):
+        """Sketches the distinct customers of new complete hours into AttendanceSketch.
+
+        Each center continues from its RollupWatermark, or starts at from_time
+        the first time. Returns the number of sketches written.
+        """
+        written_sketches = 0
+        for name in _center_names(center_name):
+            rollup_from, chunks = _rollup_chunks(
+                name, ATTENDANCE_SKETCH_ROLLUP, ATTENDANCE_SKETCH_GRANULARITY, from_time
+            )
+            for chunk_start, chunk_end in chunks:
+                hour_sketches = {}
+                frames = read_timeline_window(
+                    name, chunk_start, chunk_end - 1, attendance_columns
+                )
+                for frame in frames:
+                    hour_start = (
+                        frame["epoch_second"] // ATTENDANCE_SKETCH_GRANULARITY
+                    ) * ATTENDANCE_SKETCH_GRANULARITY
+                    sketch_frames([frame], hour_sketches.setdefault(hour_start, {}))
+
+                # Sketches are too large to share a batch, rewriting them is
+                # harmless if the watermark does not make it
+                for hour_start, sketches in hour_sketches.items():
+                    for category, sketch in sketches.items():
+                        AttendanceSketch.create(
+                            center_name=name,
+                            day_bucket=day_bucket(hour_start),
+                            hour_start=hour_start,
+                            category=category,
+                            registers=sketch.to_bytes(),
+                        )
+                        written_sketches += 1
+                RollupWatermark.create(
+                    center_name=name,
+                    rollup=ATTENDANCE_SKETCH_ROLLUP,
+                    from_epoch_second=rollup_from,
+                    epoch_second=chunk_end,
+                )
+        return written_sketches
+
+    @staticmethod
+    def count_journeys(center_name=None, lengths=None, from_time=0):
+        """Counts the journey n-grams of new complete days into JourneyNgram.
+
+        Each center and n continues from its RollupWatermark, or starts at
+        from_time the first time. Returns the number of counts written.
+        """
+        lengths = lengths or JOURNEY_NGRAM_LENGTHS
+        written_counts = 0
+        for name in _center_names(center_name):
+            for n in lengths:
+                rollup = journey_rollup_name(n)
+                rollup_from, chunks = _rollup_chunks(
+                    name, rollup, SECONDS_IN_A_DAY, from_time
+                )
+                for chunk_start, chunk_end in chunks:
+                    frames = read_timeline_window(
+                        name, chunk_start, chunk_end - 1, journey_columns
+                    )
+                    counts = journey_ngram_counts(frames, n)
+
+                    # A busy day has too many counts to share a batch, rewriting
+                    # them is harmless if the watermark does not make it
+                    for journey, customers in counts.items():
+                        JourneyNgram.create(
+                            center_name=name,
+                            n=n,
+                            day_bucket=day_bucket(chunk_start),
+                            journey=encode_journey(journey),
+                            customers=customers,
+                        )
+                        written_counts += 1
+                    RollupWatermark.create(
+                        center_name=name,
+                        rollup=rollup,
+                        from_epoch_second=rollup_from,
+                        epoch_second=chunk_end,
+                    )
+        return written_counts
+
+    @staticmethod
+    def get_attendance_sketches(center_name, from_time, to_time):
+        """Sketches of the distinct customers of a window, per category.
+
+        Whole hours come from AttendanceSketch, the rest of the window is
+        sketched from the raw Timeline.
+        """
+        sketches = {}
+        rolled_up_window = _rolled_up_window(
+            center_name,
+            ATTENDANCE_SKETCH_ROLLUP,
+            ATTENDANCE_SKETCH_GRANULARITY,
+            from_time,
+            to_time,
+        )
+        if rolled_up_window is not None:
+            rollup_start, rollup_end = rolled_up_window
+            for row in read_attendance_sketches(
+                center_name, rollup_start, rollup_end - 1
+            ):
+                merge_sketches(
+                    sketches, {row["category"]: HyperLogLog(row["registers"])}
+                )
+
+        for raw_from_time, raw_to_time in _raw_windows(
+            from_time, to_time, rolled_up_window
+        ):
+            frames = read_timeline_window(
+                center_name, raw_from_time, raw_to_time, attendance_columns
+            )
+            sketch_frames(frames, sketches)
+        return sketches
+
     @staticmethod
     def get_stages_timeline(center_name, customer_id, start_time):
         if customer_id is None or start_time is None or center_name is None:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
         try:
-            center_exist = Center.objects(name=center_name).get()
+            center_exist = metadata_cache.get_center(center_name)
             if center_exist:
-                query = Timeline.objects(
-                    center_name=center_name, epoch_second__gte=int(start_time),
-                ).all()
-                stages_timeline = [
-                    stage_timeline_mapper(frame)
-                    for frame in query
-                    if frame.global_identity == customer_id
-                ]
+                query = repository.read_customer_timeline(
+                    center_name,
+                    customer_id,
+                    start_time,
+                    columns=["epoch_second", "area_type", "area"],
+                )
+                stages_timeline = [stage_timeline_mapper(frame) for frame in query]
                 if len(stages_timeline) == 0:
                     abort(make_response(jsonify(error=CUSTOMER_NOT_FOUND), 400))
                 return stages_timeline
@@ -54,15 +712,16 @@ class TimelineFacade:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
 
         try:
-            center_exist = Center.objects(name=center_name).get()
+            center_exist = metadata_cache.get_center(center_name)
             if center_exist:
-                query = Timeline.objects(
-                    center_name=center_name, epoch_second__gte=int(start_time),
-                ).all()
+                query = repository.read_customer_timeline(
+                    center_name,
+                    customer_id,
+                    start_time,
+                    columns=["epoch_second", "happiness"],
+                )
                 happiness_timeline = [
-                    happiness_timeline_mapper(frame)
-                    for frame in query
-                    if dict(frame).get("global_identity") == customer_id
+                    happiness_timeline_mapper(frame) for frame in query
                 ]
                 if len(happiness_timeline) == 0:
                     abort(make_response(jsonify(error=CUSTOMER_NOT_FOUND), 400))
@@ -76,18 +735,26 @@ class TimelineFacade:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
 
         try:
-            center_exist = Center.objects(name=center_name).get()
+            center_exist = metadata_cache.get_center(center_name)
             if center_exist:
-                query = Timeline.objects(
-                    center_name=center_name, epoch_second__gte=int(start_time),
-                ).all()
+                frames = repository.read_customer_timeline(
+                    center_name,
+                    customer_id,
+                    start_time,
+                    columns=["epoch_second", "crop_epoch_second"],
+                )
+                if len(frames) == 0:
+                    abort(make_response(jsonify(error=CUSTOMER_NOT_FOUND), 400))
+
+                crop_epochs = set(
+                    frame["crop_epoch_second"]
+                    for frame in frames
+                    if frame["crop_epoch_second"] is not None
+                )
+                face_crops = read_face_crops(center_name, customer_id, crop_epochs)
                 footage_timeline = [
-                    footage_timeline_mapper(frame)
-                    for frame in query
-                    if dict(frame).get("global_identity") == customer_id
+                    footage_timeline_mapper(frame, face_crops) for frame in frames
                 ]
-                if len(footage_timeline) == 0:
-                    abort(make_response(jsonify(error=CUSTOMER_NOT_FOUND), 400))
 
                 footage_timeline = [
                     face_crop for face_crop in footage_timeline if face_crop is not None
@@ -97,6 +764,8 @@ class TimelineFacade:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
     @staticmethod
+    @window_cache.cached(to_time_argument="end_time")
+    @single_flight.coalesced
     def get_history(center, history_type, start_time, end_time, time_interval, role):
         if (
             center is None
@@ -115,117 +784,34 @@ class TimelineFacade:
             abort(make_response(jsonify(error=INVALID_FORMAT), 400))
 
         if center == "ALL" and role == "general-manager":
-            centers = Center.objects().all()
-            center_list = [center.name for center in centers]
-            customers = Timeline.objects(
-                center_name__in=center_list,
-                epoch_second__gte=int(start_time),
-                epoch_second__lte=int(end_time),
-            ).all()
+            center_list = metadata_cache.get_center_names()
         else:
             try:
-                center_exist = Center.objects(name=center).get()
+                center_exist = metadata_cache.get_center(center)
             except cassandra.cqlengine.query.DoesNotExist:
                 abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
             if center_exist:
-                customers = Timeline.objects(
-                    center_name=center,
-                    epoch_second__gte=int(start_time),
-                    epoch_second__lte=int(end_time),
-                ).all()
-
-        list_timelines = [
-            (
-                timeline.epoch_second,
-                timeline.gender,
-                timeline.ethnicity,
-                timeline.age,
-                timeline.happiness,
-            )
-            for timeline in customers
-        ]
-
-        list_timelines = [timeline for timeline in list_timelines if all(timeline)]
+                center_list = [center]
+        if len(center_list) <= 0:
+            return []
 
-        df_db = pd.DataFrame(
-            list_timelines,
-            columns=["epoch_second", "gender", "ethnicity", "age", "happiness"],
+        df_counts = pd.concat(
+            [
+                _history_counts(center_name, start_time, end_time, time_interval)
+                for center_name in center_list
+            ],
+            ignore_index=True,
         )
-        if len(df_db) <= 0:
+        if len(df_counts) <= 0:
             return []
-        df_db["epoch_second_interval"] = df_db.apply(
-            lambda row: int(row.epoch_second / time_interval), axis=1
-        )
-        list_epoch_interval = list(df_db["epoch_second_interval"].unique())
-
-        if history_type == "happiness":
-            df_grouped_gender = (
-                df_db[["epoch_second_interval", "gender", "happiness"]]
-                .groupby(["epoch_second_interval", "gender"], as_index=False)
-                .mean()
-            )
-            df_grouped_ethnicity = (
-                df_db[["epoch_second_interval", "ethnicity", "happiness"]]
-                .groupby(["epoch_second_interval", "ethnicity"], as_index=False)
-                .mean()
-            )
-            df_grouped_age = (
-                df_db[["epoch_second_interval", "age", "happiness"]]
-                .groupby(["epoch_second_interval", "age"], as_index=False)
-                .mean()
-            )
-
-            return [
-                history_happiness_mapper(
-                    epoch_interval,
-                    time_interval,
-                    df_grouped_gender.loc[
-                        df_grouped_gender["epoch_second_interval"] == epoch_interval
-                    ],
-                    df_grouped_ethnicity.loc[
-                        df_grouped_ethnicity["epoch_second_interval"] == epoch_interval
-                    ],
-                    df_grouped_age.loc[
-                        df_grouped_age["epoch_second_interval"] == epoch_interval
-                    ],
-                )
-                for epoch_interval in list_epoch_interval
-            ]
-        elif history_type == "attendance":
-            df_grouped_gender = (
-                df_db[["epoch_second_interval", "gender", "happiness"]]
-                .groupby(["epoch_second_interval", "gender"], as_index=False)
-                .count()
-            )
-            df_grouped_ethnicity = (
-                df_db[["epoch_second_interval", "ethnicity", "happiness"]]
-                .groupby(["epoch_second_interval", "ethnicity"], as_index=False)
-                .count()
-            )
-            df_grouped_age = (
-                df_db[["epoch_second_interval", "age", "happiness"]]
-                .groupby(["epoch_second_interval", "age"], as_index=False)
-                .count()
-            )
-
-            return [
-                history_happiness_mapper(
-                    epoch_interval,
-                    time_interval,
-                    df_grouped_gender.loc[
-                        df_grouped_gender["epoch_second_interval"] == epoch_interval
-                    ],
-                    df_grouped_ethnicity.loc[
-                        df_grouped_ethnicity["epoch_second_interval"] == epoch_interval
-                    ],
-                    df_grouped_age.loc[
-                        df_grouped_age["epoch_second_interval"] == epoch_interval
-                    ],
-                )
-                for epoch_interval in list_epoch_interval
-            ]
+        df_counts = df_counts.groupby(
+            ["epoch_second_interval", "dimension", "dimension_value"], as_index=False
+        )[["frames", "happiness_sum"]].sum()
+        return history_records(df_counts, history_type, time_interval)
 
     @staticmethod
+    @window_cache.cached()
+    @single_flight.coalesced
     def get_journey_summary(center, from_time, to_time):
         if (
             center is None
@@ -240,142 +826,94 @@ class TimelineFacade:
             )
 
         try:
-            center_exists = Center.objects(name=center).get()
+            center_exists = metadata_cache.get_center(center)
         except cassandra.cqlengine.query.DoesNotExist:
             return abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
         if center_exists:
-            timeframes_list = Timeline.objects(
-                center_name=center,
-                epoch_second__gte=from_time,
-                epoch_second__lte=to_time,
-            ).all()
-
-            area_hx_per_id_list = [
-                (frame.global_identity, frame.area_type, frame.area, frame.happiness)
-                for frame in timeframes_list
-            ]
-            df_db = pd.DataFrame(
-                area_hx_per_id_list, columns=["id", "area_type", "area_name", "hx"]
-            )
-
-            df_db.drop(
-                df_db[df_db.area_type.str.contains("Free") | df_db.hx.isnull()].index,
-                inplace=True,
+            df_db = db.read_timeline_frame(
+                center, from_time, to_time, journey_summary_columns
             )
-
-            if len(df_db) <= 0:
-                return {"areas_journey": [], "area_usage": []}
-
-            df_db = (
-                df_db[["id", "area_type", "area_name", "hx"]]
-                .groupby(["id", "area_type", "area_name"], as_index=False)
-                .mean()
-            )
-
-            df_db_usage = (
-                df_db[["id", "area_name"]]
-                .groupby(["area_name"], as_index=False)
-                .count()
-            )
-
-            area_usage = [
-                {
-                    "area": item.area_name,
-                    "value": (item.id / len(df_db)) if len(df_db) > 0 else 0,
-                }
-                for item in df_db_usage.itertuples()
-            ]
-
-            df_db_hx_per_type = (
-                df_db[["area_type", "hx"]].groupby(["area_type"], as_index=False).mean()
-            )
-            areas_journey = [
-                {"area_type": item.area_type, "value": item.hx}
-                for item in df_db_hx_per_type.itertuples()
-            ]
-            areas_journey.sort(key=sortByArea)
-
-            return {"areas_journey": areas_journey, "area_usage": area_usage}
+            return journey_summary(df_db)
 
     @staticmethod
-    def get_most_traveled_journey(center, from_time, to_time):
+    @single_flight.coalesced
+    def get_most_traveled_journey(center, from_time, to_time, n=default_journey_length):
         if center is None or from_time > to_time:
             abort(
                 make_response(
                     jsonify(error="{NULL_PARAMS} and {INVALID_TIME_RANGES}"), 400
                 )
             )
+        if n <= 0:
+            abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         try:
-            # getting unique entries of timeline sorted by timestamp
-            center_exists = Center.objects(name=center).get()
-            if center_exists:
-                query = (
-                    Timeline.objects(
-                        center_name=center,
-                        epoch_second__gte=from_time,
-                        epoch_second__lte=to_time,
-                    )
-                    .order_by("epoch_second")
-                    .all()
-                )
-                items = [
-                    (item["global_identity"], item["area"], item["area_type"])
-                    for item in query
-                    if item["area_type"] != "Free"
-                ]
-                items = pd.Series(items).drop_duplicates().tolist()
-
-                # Group by Global_id => transition list by client
-                journeys = {}
-                for item in items:
-                    if journeys.get(item[0]) is None:
-                        journeys[item[0]] = []
-                    journeys[item[0]].append(item[1])
-
-                # split into groups of n
-                n = 3
-                for customer, values in journeys.items():
-                    full_journey = journeys[customer]
-                    splitted_journey = []
-                    for i, stage in enumerate(full_journey):
-                        # if len(full_journey) < n:
-                        #     splitted_journey.append(tuple(full_journey))
-                        if i + n <= len(full_journey):
-                            split = full_journey[i : i + n]
-                            splitted_journey.append(tuple(split))
-                    journeys[customer] = splitted_journey
-
-                # get percentage of usage
-                num_of_clients = len(journeys)
-                journey_counts = {}
-                for item, values in journeys.items():
-                    values = pd.Series(values).drop_duplicates().tolist()
-                    for journey in values:
-                        journey_id = "-".join(journey)
-                        if journey_counts.get(journey_id) is None:
-                            journey_counts[journey_id] = 1
-                        else:
-                            journey_counts[journey_id] += 1
-
-                areas = Areas.objects().all()
-                area_mapper = create_area_mapper(areas)
-
-                journey_usage = []
-                for item, values in journey_counts.items():
-                    stages_names = item.split("-")
-                    stages_names = list(map(area_mapper, stages_names))
-                    journey_entry = {
-                        "journey": stages_names,
-                        "percent": values / num_of_clients,
-                    }
-                    journey_usage.append(journey_entry)
-                return journey_usage
+            metadata_cache.get_center(center)
         except cassandra.cqlengine.query.DoesNotExist:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
+        return _journey_usage(center, _journey_counts(center, from_time, to_time, n))
+
     @staticmethod
-    def get_heatmap(center, from_time, to_time, global_identity=None):
+    def get_report(center, from_time, to_time, on_progress=None):
+        """Every section of a center's report, from a single scan of the window.
+
+        on_progress, when given, is called with the fraction of the report done.
+        """
+        if center is None or from_time is None or to_time is None:
+            abort(make_response(jsonify(error=NULL_PARAMS), 400))
+        if from_time >= to_time:
+            abort(make_response(jsonify(error=INVALID_TIME_RANGES), 400))
+        try:
+            metadata_cache.get_center(center)
+        except cassandra.cqlengine.query.DoesNotExist:
+            abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
+
+        progress = on_progress or (lambda fraction: None)
+        df_db = db.read_timeline_frame(center, from_time, to_time, report_columns)
+        time_interval = report_interval(from_time, to_time)
+        progress(1 / REPORT_STEPS)
+
+        hx_index = []
+        df_history = history_frames(df_db[history_columns])
+        if len(df_history) > 0:
+            hx_index = history_records(
+                history_counts(df_history, time_interval), "happiness", time_interval
+            )
+        progress(2 / REPORT_STEPS)
+
+        attendance = {"general": attendance_counts(df_db), "intervals": []}
+        if to_time - from_time > SECONDS_IN_A_DAY:
+            attendance["intervals"] = attendance_intervals(df_db, from_time, to_time)
+        progress(3 / REPORT_STEPS)
+
+        waiting_time = waiting_time_chart(df_db, time_interval)
+        progress(4 / REPORT_STEPS)
+
+        journey_frames = df_db[["epoch_second"] + journey_columns].to_dict("records")
+        most_traveled_journeys = _journey_usage(
+            center, _daily_journey_counts(journey_frames, default_journey_length)
+        )
+        progress(5 / REPORT_STEPS)
+
+        return {
+            "hx_index": hx_index,
+            "customer_attendance": attendance,
+            "waiting_time": waiting_time,
+            "most_traveled_journeys": most_traveled_journeys,
+            "area_usage": journey_summary(df_db),
+        }
+
+    @staticmethod
+    @window_cache.cached()
+    @single_flight.coalesced
+    def get_heatmap(
+        center,
+        from_time,
+        to_time,
+        global_identity=None,
+        cell_size=default_heatmap_cell_size,
+    ):
         if (
             center is None
             or from_time is None
@@ -387,57 +925,33 @@ class TimelineFacade:
                     jsonify(error="{NULL_PARAMS} and {INVALID_TIME_RANGES}"), 400
                 )
             )
+        if cell_size <= 0:
+            abort(make_response(jsonify(error=INVALID_FORMAT), 400))
         try:
-            center_exists = Center.objects(name=center).get()
+            center_exists = metadata_cache.get_center(center)
         except cassandra.cqlengine.query.DoesNotExist:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
         if center_exists:
-            customers_history = Timeline.objects(
-                center_name=center,
-                epoch_second__gte=from_time,
-                epoch_second__lte=to_time,
-            ).all()
-
             if global_identity is not None:
-                movement_history = [
-                    (movement.position_x, movement.position_y, movement.epoch_second)
-                    for movement in customers_history
-                    if movement.global_identity == global_identity
-                ]
+                df_db = db.read_customer_timeline_frame(
+                    center, global_identity, from_time, to_time, heatmap_columns
+                )
+                cells, counts = heatmap_cells(df_db, cell_size)
             else:
-                movement_history = [
-                    (movement.position_x, movement.position_y, movement.epoch_second)
-                    for movement in customers_history
-                ]
-
-            df_db = pd.DataFrame(movement_history, columns=["x", "y", "epoch_second"])
-            if len(df_db) <= 0:
+                cells, counts = _heatmap_cells(center, from_time, to_time, cell_size)
+            if len(counts) <= 0:
                 return {"values": [], "max": 0}
 
-            # Aggregation by squares of size N pixels, and reposition coord to center of square.
-            square_size = 50
-            df_db["x"] = df_db.apply(
-                lambda row: int(row.x / square_size) * square_size + square_size / 2,
-                axis=1,
-            )
-            df_db["y"] = df_db.apply(
-                lambda row: int(row.y / square_size) * square_size + square_size / 2,
-                axis=1,
-            )
-            df_grouped_coords = (
-                df_db[["x", "y", "epoch_second"]]
-                .groupby(["x", "y"], as_index=False)
-                .count()
-            )
-
-            max_value = df_grouped_coords["epoch_second"].max()
+            # Squares of cell_size pixels are placed at their center.
+            cells = cells * cell_size + cell_size // 2
             values_row = [
-                {"x": int(row.x), "y": int(row.y), "value": row.epoch_second}
-                for row in df_grouped_coords.itertuples()
+                {"x": x, "y": y, "value": value}
+                for (x, y), value in zip(cells.tolist(), counts.tolist())
             ]
-            return {"values": values_row, "max": int(max_value)}
+            return {"values": values_row, "max": int(counts.max())}
 
     @staticmethod
+    @single_flight.coalesced
     def get_center_area_dwell_sum(center_name, from_time, to_time):
         if (
             center_name is None
@@ -452,9 +966,9 @@ class TimelineFacade:
             )
 
         try:
-            center_exist = Center.objects(name=center_name).get()
+            center_exist = metadata_cache.get_center(center_name)
             if center_exist:
-                areas = Areas.objects(center_name=center_name).all()
+                areas = metadata_cache.get_areas(center_name)
                 enconding = "utf-8"
                 list_areas = [
                     {
@@ -517,37 +1031,46 @@ class TimelineFacade:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
     @staticmethod
+    @single_flight.coalesced
     def get_dwell_heatmap(center, from_time, to_time):
         areas_dwell_info = TimelineFacade.get_center_area_dwell_sum(
             center, from_time, to_time
         )
         points = TimelineFacade.get_heatmap(center, from_time, to_time)
+        if len(points["values"]) <= 0:
+            return {"max": 0, "values": []}
+
+        area_dwells = {
+            (area["area_type"], area["area_name"]): area["dwell"]
+            for area in areas_dwell_info["areas"]
+        }
+        labels, raster_areas = metadata_cache.get_zone_raster(center)
+        point_labels = zone_labels(
+            labels,
+            [point["x"] for point in points["values"]],
+            [point["y"] for point in points["values"]],
+        )
+
         list_points = []
         max = 0
-        for point in points["values"]:
-            if "x" in point and "y" in point and "value" in point:
-                for area in areas_dwell_info["areas"]:
-                    ctr = np.array(area["polygon"]).reshape((-1, 1, 2)).astype(np.int32)
-                    if (
-                        cv2.pointPolygonTest(
-                            ctr, tuple((point["x"], point["y"])), False
-                        )
-                        >= 0
-                    ):
-                        if point.get("value", 0) > 0:
-                            point["dwell"] = int(area["dwell"] / point["value"])
-                        else:
-                            point["dwell"] = 0
-                        if point.get("value") is not None:
-                            del point["value"]
-                        list_points.append(point)
-                        if point["dwell"] > max:
-                            max = point["dwell"]
+        for point, label in zip(points["values"], point_labels.tolist()):
+            if label == 0 or raster_areas[label - 1] not in area_dwells:
+                continue
+            area_dwell = area_dwells[raster_areas[label - 1]]
+            # points is shared with concurrent get_heatmap callers, left as is
+            dwell = 0
+            if point["value"] > 0:
+                dwell = int(area_dwell / point["value"])
+            list_points.append({"x": point["x"], "y": point["y"], "dwell": dwell})
+            if dwell > max:
+                max = dwell
 
         return {"max": max, "values": list_points}
 
     @staticmethod
-    def get_historic_attendance(center, from_time, to_time):
+    @window_cache.cached()
+    @single_flight.coalesced
+    def get_historic_attendance(center, from_time, to_time, approximate=False):
         if center is None or from_time > to_time:
             abort(
                 make_response(
@@ -555,14 +1078,8 @@ class TimelineFacade:
                 )
             )
         try:
-            center_exists = Center.objects(name=center).get()
+            center_exists = metadata_cache.get_center(center)
             if center_exists:
-                query = Timeline.objects(
-                    center_name=center,
-                    epoch_second__gte=from_time,
-                    epoch_second__lte=to_time,
-                ).all()
-                checked_id_list = []
                 response = {
                     "total_customers": 0,
                     "Female": 0,
@@ -571,16 +1088,32 @@ class TimelineFacade:
                     "Non": 0,
                     "mask_on": 0,
                 }
+                if approximate:
+                    sketches = TimelineFacade.get_attendance_sketches(
+                        center, from_time, to_time
+                    )
+                    for category in response:
+                        if category in sketches:
+                            response[category] = sketches[category].count()
+                    return response
+
+                query = read_timeline_window(
+                    center,
+                    from_time,
+                    to_time,
+                    ["global_identity", "gender", "ethnicity", "mask"],
+                )
+                checked_ids = set()
                 for customer in query:
-                    if customer.global_identity not in checked_id_list:
-                        checked_id_list.append(customer.global_identity)
-                        if customer.gender is not None:
-                            response[customer.gender] += 1
-                        if customer.ethnicity is not None:
-                            response[customer.ethnicity] += 1
-                        if customer.mask == "Mask":
+                    if customer["global_identity"] not in checked_ids:
+                        checked_ids.add(customer["global_identity"])
+                        if customer["gender"] is not None:
+                            response[customer["gender"]] += 1
+                        if customer["ethnicity"] is not None:
+                            response[customer["ethnicity"]] += 1
+                        if customer["mask"] == "Mask":
                             response["mask_on"] += 1
-                response["total_customers"] = len(checked_id_list)
+                response["total_customers"] = len(checked_ids)
                 return response
         except cassandra.cqlengine.query.DoesNotExist:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
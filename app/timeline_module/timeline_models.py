@@ -24,10 +24,164 @@ class Timeline(Model):
     gender = columns.Text()
     ethnicity = columns.Text()
     happiness = columns.Integer()
-    face_crop = columns.Blob()
+    crop_epoch_second = columns.BigInt()
     mask = columns.Text()
 
 
+class TimelineByCustomer(Model):
+    __options__ = {
+        "compaction": {
+            "class": "LeveledCompactionStrategy",
+            "sstable_size_in_mb": "128",
+            "tombstone_threshold": ".2",
+        },
+        "comment": "Timeline frames of a single customer, kept in sync with Timeline",
+    }
+    __keyspace__ = "cja_data"
+    center_name = columns.Text(partition_key=True)
+    global_identity = columns.Text(partition_key=True)
+    epoch_second = columns.BigInt(primary_key=True, required=True)
+
+    area = columns.Text(required=True)
+    area_type = columns.Text()
+    position_x = columns.Integer()
+    position_y = columns.Integer()
+
+    age = columns.Text()
+    gender = columns.Text()
+    ethnicity = columns.Text()
+    happiness = columns.Integer()
+    crop_epoch_second = columns.BigInt()
+    mask = columns.Text()
+
+
+class TimelineByDay(Model):
+    __options__ = {
+        "compaction": {
+            "class": "LeveledCompactionStrategy",
+            "sstable_size_in_mb": "128",
+            "tombstone_threshold": ".2",
+        },
+        "comment": "Timeline frames bucketed by day, kept in sync with Timeline",
+    }
+    __keyspace__ = "cja_data"
+    center_name = columns.Text(partition_key=True)
+    day_bucket = columns.Integer(partition_key=True)
+    epoch_second = columns.BigInt(primary_key=True, required=True)
+    global_identity = columns.Text(primary_key=True, required=True)
+
+    area = columns.Text(required=True)
+    area_type = columns.Text()
+    position_x = columns.Integer()
+    position_y = columns.Integer()
+
+    age = columns.Text()
+    gender = columns.Text()
+    ethnicity = columns.Text()
+    happiness = columns.Integer()
+    crop_epoch_second = columns.BigInt()
+    mask = columns.Text()
+
+
+class FaceCrop(Model):
+    __options__ = {
+        "compaction": {
+            "class": "LeveledCompactionStrategy",
+            "sstable_size_in_mb": "128",
+            "tombstone_threshold": ".2",
+        },
+        "comment": "Face crops referenced by Timeline.crop_epoch_second",
+    }
+    __keyspace__ = "cja_data"
+    center_name = columns.Text(partition_key=True)
+    global_identity = columns.Text(partition_key=True)
+    epoch_second = columns.BigInt(primary_key=True, required=True)
+    crop_hash = columns.Text(required=True)
+    face_crop = columns.Blob(required=True)
+
+
+class HistoryRollup(Model):
+    __options__ = {
+        "compaction": {
+            "class": "LeveledCompactionStrategy",
+            "sstable_size_in_mb": "64",
+            "tombstone_threshold": ".2",
+        },
+        "comment": "Frame count and happiness sum per demographic value and bucket",
+    }
+    __keyspace__ = "cja_data"
+    center_name = columns.Text(partition_key=True)
+    granularity = columns.Integer(partition_key=True)
+    bucket_start = columns.BigInt(primary_key=True, required=True)
+    dimension = columns.Text(primary_key=True, required=True)
+    dimension_value = columns.Text(primary_key=True, required=True)
+    frames = columns.BigInt(required=True)
+    happiness_sum = columns.BigInt(required=True)
+
+
+class HeatmapTile(Model):
+    __options__ = {
+        "compaction": {
+            "class": "LeveledCompactionStrategy",
+            "sstable_size_in_mb": "64",
+            "tombstone_threshold": ".2",
+        },
+        "comment": "Sparse position counts per heatmap square, one row per hour",
+    }
+    __keyspace__ = "cja_data"
+    center_name = columns.Text(partition_key=True)
+    cell_size = columns.Integer(partition_key=True)
+    hour_start = columns.BigInt(primary_key=True, required=True)
+    # int64 (x, y, count) triples, see timeline_utils.encode_heatmap_cells
+    cells = columns.Blob(required=True)
+
+
+class AttendanceSketch(Model):
+    __options__ = {
+        "compaction": {
+            "class": "LeveledCompactionStrategy",
+            "sstable_size_in_mb": "64",
+            "tombstone_threshold": ".2",
+        },
+        "comment": "HyperLogLog sketches of the distinct customers of each hour",
+    }
+    __keyspace__ = "cja_data"
+    center_name = columns.Text(partition_key=True)
+    day_bucket = columns.Integer(partition_key=True)
+    hour_start = columns.BigInt(primary_key=True, required=True)
+    category = columns.Text(primary_key=True, required=True)
+    registers = columns.Blob(required=True)
+
+
+class JourneyNgram(Model):
+    __options__ = {
+        "compaction": {
+            "class": "LeveledCompactionStrategy",
+            "sstable_size_in_mb": "64",
+            "tombstone_threshold": ".2",
+        },
+        "comment": "Customers per day that went through each sequence of n areas",
+    }
+    __keyspace__ = "cja_data"
+    center_name = columns.Text(partition_key=True)
+    n = columns.Integer(partition_key=True)
+    day_bucket = columns.Integer(primary_key=True, required=True)
+    # JSON list of area names, the empty list holds the day's customers
+    journey = columns.Text(primary_key=True, required=True)
+    customers = columns.BigInt(required=True)
+
+
+class RollupWatermark(Model):
+    __options__ = {
+        "comment": "Epoch range over which each rollup of a center is complete",
+    }
+    __keyspace__ = "cja_data"
+    center_name = columns.Text(partition_key=True)
+    rollup = columns.Text(primary_key=True, required=True)
+    from_epoch_second = columns.BigInt(required=True)
+    epoch_second = columns.BigInt(required=True)
+
+
 class CustomerTracker(Model):
     __options__ = {
         "compaction": {
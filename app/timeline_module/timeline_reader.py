@@ -0,0 +1,184 @@
+from app.persistence_module import repository
+from collections import deque
+from operator import itemgetter
+import heapq
+
+SECONDS_IN_A_DAY = 60 * 60 * 24
+MAX_IN_FLIGHT_QUERIES = 32
+
+
+def day_bucket(epoch_second):
+    return int(epoch_second) // SECONDS_IN_A_DAY
+
+
+def day_buckets(from_time, to_time):
+    return range(day_bucket(from_time), day_bucket(to_time) + 1)
+
+
+def timeline_window_query(columns=None):
+    """Builds the bucket query selecting only the given columns.
+
+    epoch_second is always selected because frames are merged on it.
+    """
+    if columns is not None and "epoch_second" not in columns:
+        columns = ["epoch_second"] + list(columns)
+    return repository.TIMELINE_WINDOW_QUERY.format(
+        columns=repository.select_columns(columns)
+    )
+
+
+def _bucket_results(center_names, from_time, to_time, query, session=None):
+    """Yields, bucket by bucket, the result sets of every center.
+
+    At most MAX_IN_FLIGHT_QUERIES bucket queries are pending at any time.
+    """
+    pending_buckets = deque()
+    for bucket in day_buckets(from_time, to_time):
+        pending_buckets.append(
+            [
+                repository.execute_async(
+                    query, (center_name, bucket, from_time, to_time), session
+                )
+                for center_name in center_names
+            ]
+        )
+        if len(pending_buckets) * len(center_names) >= MAX_IN_FLIGHT_QUERIES:
+            yield [future.result() for future in pending_buckets.popleft()]
+
+    while pending_buckets:
+        yield [future.result() for future in pending_buckets.popleft()]
+
+
+def read_timeline_window(center_names, from_time, to_time, columns=None):
+    """Yields the Timeline frames of one or more centers within a time window.
+
+    The window is split into day buckets that are queried concurrently and the
+    frames come back in epoch_second order. When columns is given only those
+    are fetched.
+    """
+    if isinstance(center_names, str):
+        center_names = [center_names]
+    query = timeline_window_query(columns)
+
+    for results in _bucket_results(center_names, int(from_time), int(to_time), query):
+        if len(results) == 1:
+            yield from results[0]
+        else:
+            yield from heapq.merge(*results, key=itemgetter("epoch_second"))
+
+
+def read_timeline_pages(center_names, from_time, to_time, columns, session):
+    """Yields the raw result pages of a Timeline window, bucket by bucket.
+
+    Meant for sessions with a page-level row factory, see Persistence.
+    """
+    if isinstance(center_names, str):
+        center_names = [center_names]
+    query = timeline_window_query(columns)
+
+    for results in _bucket_results(
+        center_names, int(from_time), int(to_time), query, session
+    ):
+        for result in results:
+            yield from result
+
+
+def read_attendance_sketches(center_name, from_time, to_time):
+    """Yields the stored attendance sketches of the hours starting in a window."""
+    for results in _bucket_results(
+        [center_name], int(from_time), int(to_time), repository.ATTENDANCE_SKETCH_QUERY
+    ):
+        yield from results[0]
+
+
+def _collect_face_crops(future, face_crops):
+    for row in future.result():
+        face_crops[row["epoch_second"]] = row["face_crop"]
+
+
+def read_face_crops(center_name, global_identity, crop_epochs):
+    """Fetches a customer's face crops by key, concurrently.
+
+    Returns the crops indexed by the epoch_second they were stored at.
+    """
+    face_crops = {}
+
+    pending_crops = deque()
+    for crop_epoch in crop_epochs:
+        pending_crops.append(
+            repository.execute_async(
+                repository.FACE_CROP_QUERY, (center_name, global_identity, crop_epoch)
+            )
+        )
+        if len(pending_crops) >= MAX_IN_FLIGHT_QUERIES:
+            _collect_face_crops(pending_crops.popleft(), face_crops)
+
+    while pending_crops:
+        _collect_face_crops(pending_crops.popleft(), face_crops)
+    return face_crops
+
+
+def _sum_dwell_times(global_identity, future, dwell_times):
+    dwell_times[global_identity] = sum(
+        [row["dwell_time"] for row in future.result() if row["dwell_time"] is not None]
+    )
+
+
+def read_dwell_times(center_name, global_identities, areas, from_time, to_time):
+    """Sums the dwell time of each customer in the given areas, concurrently.
+
+    Returns the totals indexed by global_identity.
+    """
+    dwell_times = {global_identity: 0 for global_identity in global_identities}
+    if not areas:
+        return dwell_times
+
+    pending_customers = deque()
+    for global_identity in global_identities:
+        pending_customers.append(
+            (
+                global_identity,
+                repository.execute_async(
+                    repository.DWELL_TIME_QUERY,
+                    (center_name, global_identity, areas, from_time, to_time),
+                ),
+            )
+        )
+        if len(pending_customers) >= MAX_IN_FLIGHT_QUERIES:
+            _sum_dwell_times(*pending_customers.popleft(), dwell_times)
+
+    while pending_customers:
+        _sum_dwell_times(*pending_customers.popleft(), dwell_times)
+    return dwell_times
+
+
+def read_customer_timelines(
+    center_name, global_identities, from_time, to_time, columns=None
+):
+    """Fetches the frames of several customers within a window, concurrently.
+
+    Returns each customer's frames in epoch order, indexed by global_identity.
+    """
+    query = repository.CUSTOMER_TIMELINE_WINDOW_QUERY.format(
+        columns=repository.select_columns(columns)
+    )
+    timelines = {}
+
+    pending_customers = deque()
+    for global_identity in global_identities:
+        pending_customers.append(
+            (
+                global_identity,
+                repository.execute_async(
+                    query, (center_name, global_identity, int(from_time), int(to_time)),
+                ),
+            )
+        )
+        if len(pending_customers) >= MAX_IN_FLIGHT_QUERIES:
+            global_identity, future = pending_customers.popleft()
+            timelines[global_identity] = list(future.result())
+
+    while pending_customers:
+        global_identity, future = pending_customers.popleft()
+        timelines[global_identity] = list(future.result())
+    return timelines
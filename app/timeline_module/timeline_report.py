@@ -0,0 +1,85 @@
+"""Report sections computed from a single frame of a center's window."""
+from .timeline_reader import SECONDS_IN_A_DAY, day_buckets
+
+report_columns = [
+    "epoch_second",
+    "global_identity",
+    "gender",
+    "ethnicity",
+    "age",
+    "happiness",
+    "mask",
+    "area",
+    "area_type",
+]
+
+
+def report_interval(from_time, to_time):
+    """Daily points for windows longer than a day, hourly ones otherwise."""
+    if to_time - from_time > SECONDS_IN_A_DAY:
+        return SECONDS_IN_A_DAY
+    return 60 * 60
+
+
+def attendance_counts(df_db):
+    """Customers of a window per gender, ethnicity and mask, from their first frame."""
+    response = {
+        "total_customers": 0,
+        "Female": 0,
+        "Male": 0,
+        "Local": 0,
+        "Non": 0,
+        "mask_on": 0,
+    }
+    df_first = df_db.drop_duplicates("global_identity")
+    for column in ["gender", "ethnicity"]:
+        for value, count in df_first[column].value_counts().items():
+            response[value] = response.get(value, 0) + int(count)
+    response["mask_on"] = int((df_first["mask"] == "Mask").sum())
+    response["total_customers"] = len(df_first)
+    return response
+
+
+def attendance_intervals(df_db, from_time, to_time):
+    """The attendance_counts of each day of a window."""
+    df_days = dict(list(df_db.groupby(df_db["epoch_second"] // SECONDS_IN_A_DAY)))
+    intervals = []
+    for bucket in day_buckets(from_time, to_time):
+        interval = {
+            "from_time": max(int(from_time), bucket * SECONDS_IN_A_DAY),
+            "to_time": min(int(to_time), (bucket + 1) * SECONDS_IN_A_DAY - 1),
+        }
+        interval.update(attendance_counts(df_days.get(bucket, df_db.iloc[0:0])))
+        intervals.append(interval)
+    return intervals
+
+
+def waiting_time_chart(df_db, time_interval):
+    """Customers seen waiting and their average wait in minutes, per interval.
+
+    A customer's wait in an interval spans their first to last frame in a
+    Waiting area.
+    """
+    df_waiting = df_db.loc[
+        df_db["area_type"] == "Waiting", ["epoch_second", "global_identity"]
+    ]
+    if len(df_waiting) <= 0:
+        return []
+    intervals = (df_waiting["epoch_second"] / time_interval).astype("int64")
+    df_waiting = df_waiting.assign(epoch_second_interval=intervals)
+    df_spans = df_waiting.groupby(["epoch_second_interval", "global_identity"])[
+        "epoch_second"
+    ].agg(["min", "max"])
+    df_waits = (
+        (df_spans["max"] - df_spans["min"]).groupby(level=0).agg(["count", "mean"])
+    )
+    return [
+        {
+            "time": int(interval * time_interval),
+            "total_ppl_waiting": int(customers),
+            "total_waiting_time": int(wait // 60),
+        }
+        for interval, customers, wait in zip(
+            df_waits.index, df_waits["count"], df_waits["mean"]
+        )
+    ]
@@ -1,7 +1,9 @@
 import pytest
 import json
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from app.utils import test_base_url, BAD_REQUEST, OK
+from app.timeline_module.timeline_utils import merge_heatmap_cells
 
 pytestmark = pytest.mark.asyncio
 
@@ -105,6 +107,28 @@ async def test_get_footage_timeline(params, expected_response):
             },
             OK,
         ),
+        (
+            {
+                "center": "Headquarters",
+                "history_type": "happiness",
+                "from_time": 1591106400,
+                "to_time": 1591110470,
+                "time_interval": 60,
+                "align": "hour",
+            },
+            OK,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "history_type": "happiness",
+                "from_time": 1591106400,
+                "to_time": 1591110470,
+                "time_interval": 60,
+                "align": "week",
+            },
+            BAD_REQUEST,
+        ),
         (
             {
                 "center": "Wrong Center",
@@ -232,6 +256,43 @@ async def test_get_history(params, expected_response):
     assert r.status_code == expected_response
 
 
+async def test_get_history_align():
+    params = {
+        "center": "Headquarters",
+        "history_type": "attendance",
+        "from_time": 1591106401,
+        "to_time": 1591110470,
+        "time_interval": 60,
+        "align": "hour",
+    }
+    # Cross-origin, as the dashboards call it
+    r = requests.get(
+        f"{base_url}/history", params=params, headers={"Origin": "http://dashboard"}
+    )
+    assert r.status_code == OK
+    assert r.headers["X-Window-From"] == "1591106400"
+    assert r.headers["X-Window-To"] == "1591113599"
+    assert "X-Window-From" in r.headers["Access-Control-Expose-Headers"]
+
+
+async def test_get_history_concurrent():
+    params = {
+        "center": "Headquarters",
+        "history_type": "happiness",
+        "from_time": 1591106400,
+        "to_time": 1591110470,
+        "time_interval": 60,
+    }
+    with ThreadPoolExecutor(8) as executor:
+        responses = list(
+            executor.map(
+                lambda _: requests.get(f"{base_url}/history", params=params), range(8)
+            )
+        )
+    assert all(r.status_code == OK for r in responses)
+    assert all(r.json() == responses[0].json() for r in responses)
+
+
 @pytest.mark.parametrize(
     "params, expected_response",
     [
@@ -260,6 +321,15 @@ async def test_get_journey_summary(params, expected_response):
         ),
         ({"center": "Headquarters", "from_time": 3000, "to_time": 2000}, BAD_REQUEST),
         ({"center": "Headquarters", "from_time": "Wrong Time"}, BAD_REQUEST),
+        ({"center": "Headquarters", "from_time": 1000, "to_time": 2000, "n": 2}, OK),
+        (
+            {"center": "Headquarters", "from_time": 1000, "to_time": 2000, "n": 0},
+            BAD_REQUEST,
+        ),
+        (
+            {"center": "Headquarters", "from_time": 1000, "to_time": 2000, "n": "a"},
+            BAD_REQUEST,
+        ),
         ({}, BAD_REQUEST),
     ],
 )
@@ -272,6 +342,33 @@ async def test_get_most_traveled_journeys(params, expected_response):
     "params, expected_response",
     [
         ({"center": "Headquarters", "from_time": 1000, "to_time": 2000}, OK),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "cell_size": 100,
+            },
+            OK,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "cell_size": 0,
+            },
+            BAD_REQUEST,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "cell_size": "Wrong Size",
+            },
+            BAD_REQUEST,
+        ),
         (
             {"center": "Wrong Center Name", "from_time": 1000, "to_time": 2000},
             BAD_REQUEST,
@@ -286,10 +383,49 @@ async def test_heatmap_positions(params, expected_response):
     assert r.status_code == expected_response
 
 
+@pytest.mark.parametrize("path", ["position_heatmap", "position_dwell_heatmap"])
+async def test_heatmap_aligned_empty_window(path):
+    # A night hour from the start of the tiles, quiet hours have no tile
+    params = {
+        "center": "Headquarters",
+        "from_time": 1586217600,
+        "to_time": 1586217601,
+        "align": "hour",
+    }
+    r = requests.get(f"{base_url}/{path}", params=params)
+    assert r.status_code == OK
+
+
+async def test_merge_heatmap_cells_empty():
+    cells, counts = merge_heatmap_cells([], [])
+    assert cells.shape == (0, 2)
+    assert len(counts) == 0
+
+
 @pytest.mark.parametrize(
     "params, expected_response",
     [
         ({"center": "Headquarters", "from_time": 1000, "to_time": 2000, "global_identity": "C-0001"}, OK),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "global_identity": "C-0001",
+                "cell_size": 100,
+            },
+            OK,
+        ),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1000,
+                "to_time": 2000,
+                "global_identity": "C-0001",
+                "cell_size": -50,
+            },
+            BAD_REQUEST,
+        ),
         (
             {"center": "Wrong Center Name", "from_time": 1000, "to_time": 2000,"global_identity": "C-0001"},
             BAD_REQUEST,
@@ -324,6 +460,15 @@ async def test_heatmap_dwell_positions(params, expected_response):
     "params, expected_response",
     [
         ({"center": "Headquarters", "from_time": 1000, "to_time": 2000}, OK),
+        (
+            {
+                "center": "Headquarters",
+                "from_time": 1586217600,
+                "to_time": 1593590400,
+                "approximate": "true",
+            },
+            OK,
+        ),
         (
             {"center": "Wrong Center Name", "from_time": 1000, "to_time": 2000},
             BAD_REQUEST,
@@ -336,3 +481,11 @@ async def test_heatmap_dwell_positions(params, expected_response):
 async def test_historic_attendance(params, expected_response):
     r = requests.get(f"{base_url}/historic_attendance", params=params)
     assert r.status_code == expected_response
+
+
+async def test_historic_attendance_cached():
+    params = {"center": "Headquarters", "from_time": 1586217600, "to_time": 1593590400}
+    first = requests.get(f"{base_url}/historic_attendance", params=params)
+    second = requests.get(f"{base_url}/historic_attendance", params=params)
+    assert first.status_code == OK
+    assert second.json() == first.json()
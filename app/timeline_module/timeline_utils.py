@@ -1,4 +1,9 @@
+from collections import Counter
 import base64
+import json
+import math
+import numpy as np
+import pandas as pd
 
 area_positions = {"Entry": 0, "Support": 1, "Waiting": 2, "Interaction": 3, "Exit": 4}
 
@@ -6,6 +11,20 @@ gender_values = ["Male", "Female"]
 ethnicity_values = ["Local", "Nonlocal"]
 age_values = ["0-18", "19-49", "50+"]
 history_type_values = ["attendance", "happiness"]
+default_heatmap_cell_size = 50
+heatmap_columns = ["position_x", "position_y"]
+history_columns = ["epoch_second", "gender", "ethnicity", "age", "happiness"]
+history_dimensions = ["gender", "ethnicity", "age"]
+journey_columns = ["global_identity", "area", "area_type"]
+journey_summary_columns = ["global_identity", "area_type", "area", "happiness"]
+default_journey_length = 3
+history_count_columns = [
+    "epoch_second_interval",
+    "dimension",
+    "dimension_value",
+    "frames",
+    "happiness_sum",
+]
 
 
 def sortByArea(element):
@@ -14,54 +33,212 @@ def sortByArea(element):
 
 def stage_timeline_mapper(frame):
     return {
-        "timestamp": frame.epoch_second,
-        "type": frame.area_type,
-        "value": frame.area,
+        "timestamp": frame["epoch_second"],
+        "type": frame["area_type"],
+        "value": frame["area"],
     }
 
 
 def happiness_timeline_mapper(frame):
-    return {"timestamp": frame.epoch_second, "value": frame.happiness}
+    return {"timestamp": frame["epoch_second"], "value": frame["happiness"]}
 
 
-def footage_timeline_mapper(frame):
-    crop_blob = frame.face_crop
+def footage_timeline_mapper(frame, face_crops):
+    crop_blob = face_crops.get(frame["crop_epoch_second"])
     if crop_blob is not None:
         base64_crop = base64.b64encode(crop_blob)
         decoded_crop = base64_crop.decode("utf-8")
-        return {"timestamp": frame.epoch_second, "value": decoded_crop}
+        return {"timestamp": frame["epoch_second"], "value": decoded_crop}
     return None
 
 
-def history_happiness_mapper(
-    epoch_interval, time_interval, df_gender, df_ethnicity, df_grouped_age
-):
-    epoch_interval_dict = {}
-    epoch_interval_dict["time"] = int(epoch_interval * time_interval)
-    for index, row in df_gender.iterrows():
-        epoch_interval_dict[row["gender"]] = round(row["happiness"])
-    for gender_value in gender_values:
-        if gender_value not in epoch_interval_dict:
-            epoch_interval_dict[gender_value] = 0
-    for index, row in df_ethnicity.iterrows():
-        epoch_interval_dict[row["ethnicity"]] = round(row["happiness"])
-    for ethnicity_value in ethnicity_values:
-        if ethnicity_value not in epoch_interval_dict:
-            epoch_interval_dict[ethnicity_value] = 0
-
-    for index, row in df_grouped_age.iterrows():
-        epoch_interval_dict[row["age"]] = round(row["happiness"])
-    for age_value in age_values:
-        if age_value not in epoch_interval_dict:
-            epoch_interval_dict[age_value] = 0
-
-    if epoch_interval_dict["Female"] == 0:
-        epoch_interval_dict["total_avg"] = epoch_interval_dict["Male"]
-    elif epoch_interval_dict["Male"] == 0:
-        epoch_interval_dict["total_avg"] = epoch_interval_dict["Female"]
+def history_frames(df_db):
+    """Keeps the frames counted by the history, the ones with every field set."""
+    df_db = df_db.dropna()
+    return df_db[df_db.astype(bool).all(axis=1)]
+
+
+def history_counts(df_db, time_interval):
+    """Counts frames and sums happiness per interval and demographic value."""
+    df_db = df_db.assign(
+        epoch_second_interval=(df_db["epoch_second"] / time_interval).astype("int64")
+    )
+    counts = []
+    for dimension in history_dimensions:
+        df_grouped = (
+            df_db.groupby(["epoch_second_interval", dimension])["happiness"]
+            .agg(["count", "sum"])
+            .reset_index()
+            .rename(
+                columns={
+                    dimension: "dimension_value",
+                    "count": "frames",
+                    "sum": "happiness_sum",
+                }
+            )
+        )
+        df_grouped["dimension"] = dimension
+        counts.append(df_grouped)
+    return pd.concat(counts, ignore_index=True)[history_count_columns]
+
+
+def history_records(df_counts, history_type, time_interval):
+    """Builds the AverageTimeFrame of each interval from summed history counts.
+
+    Known demographic values missing from an interval are reported as 0.
+    """
+    if history_type == "happiness":
+        happiness = df_counts["happiness_sum"] / df_counts["frames"]
     else:
-        epoch_interval_dict["total_avg"] = (
-            epoch_interval_dict["Male"] + epoch_interval_dict["Female"]
-        ) / 2
+        happiness = df_counts["frames"]
+    df_counts = df_counts.assign(happiness=happiness.round())
+
+    df_history = pd.concat(
+        [
+            df_counts.loc[df_counts["dimension"] == dimension].pivot_table(
+                index="epoch_second_interval",
+                columns="dimension_value",
+                values="happiness",
+                aggfunc="first",
+            )
+            for dimension in history_dimensions
+        ],
+        axis=1,
+    ).sort_index()
+    df_history = df_history.loc[:, ~df_history.columns.duplicated(keep="last")]
+
+    known_values = gender_values + ethnicity_values + age_values
+    records = (
+        df_history.reindex(columns=known_values)
+        .fillna(0)
+        .astype("int64")
+        .to_dict("records")
+    )
+    for value in df_history.columns.difference(known_values):
+        for record, happiness in zip(records, df_history[value].tolist()):
+            if not math.isnan(happiness):
+                record[value] = int(happiness)
+
+    times = (df_history.index.to_numpy() * time_interval).astype("int64").tolist()
+    for record, time in zip(records, times):
+        record["time"] = time
+        if record["Female"] == 0:
+            record["total_avg"] = record["Male"]
+        elif record["Male"] == 0:
+            record["total_avg"] = record["Female"]
+        else:
+            record["total_avg"] = (record["Male"] + record["Female"]) / 2
+    return records
+
+
+def heatmap_cells(df_positions, cell_size):
+    """Counts the positions falling in each square of cell_size pixels.
+
+    Returns the (x, y) indexes of the non-empty squares, sorted by x then y, and
+    their counts.
+    """
+    df_positions = df_positions[heatmap_columns].dropna()
+    cells = np.floor_divide(df_positions.to_numpy(), cell_size).astype("int64")
+    return np.unique(cells.reshape((-1, 2)), axis=0, return_counts=True)
+
+
+def merge_heatmap_cells(cells, counts):
+    """Sums the counts of the same squares across several heatmap_cells parts."""
+    if len(cells) <= 0:
+        # A window of quiet hours only, which have no tile
+        return np.empty((0, 2), dtype="int64"), np.empty(0, dtype="int64")
+    cells, inverse = np.unique(
+        np.concatenate(cells).reshape((-1, 2)), axis=0, return_inverse=True
+    )
+    counts = np.bincount(
+        inverse.ravel(), weights=np.concatenate(counts), minlength=len(cells)
+    )
+    return cells, counts.astype("int64")
+
+
+def encode_heatmap_cells(cells, counts):
+    """Packs squares and counts as little-endian int64 (x, y, count) triples."""
+    return np.column_stack([cells, counts]).astype("<i8").tobytes()
+
+
+def decode_heatmap_cells(cells_bytes):
+    cells = np.frombuffer(cells_bytes, dtype="<i8").reshape((-1, 3))
+    return cells[:, :2], cells[:, 2]
+
+
+def journey_summary(df_db):
+    """Area usage and average happiness per area type of a window's frames."""
+    df_db = df_db[journey_summary_columns].rename(
+        columns={"global_identity": "id", "area": "area_name", "happiness": "hx"}
+    )
+
+    df_db.drop(
+        df_db[df_db.area_type.str.contains("Free") | df_db.hx.isnull()].index,
+        inplace=True,
+    )
+
+    if len(df_db) <= 0:
+        return {"areas_journey": [], "area_usage": []}
+
+    df_db = (
+        df_db[["id", "area_type", "area_name", "hx"]]
+        .groupby(["id", "area_type", "area_name"], as_index=False)
+        .mean()
+    )
+
+    df_db_usage = (
+        df_db[["id", "area_name"]].groupby(["area_name"], as_index=False).count()
+    )
+
+    area_usage = [
+        {
+            "area": item.area_name,
+            "value": (item.id / len(df_db)) if len(df_db) > 0 else 0,
+        }
+        for item in df_db_usage.itertuples()
+    ]
+
+    df_db_hx_per_type = (
+        df_db[["area_type", "hx"]].groupby(["area_type"], as_index=False).mean()
+    )
+    areas_journey = [
+        {"area_type": item.area_type, "value": item.hx}
+        for item in df_db_hx_per_type.itertuples()
+    ]
+    areas_journey.sort(key=sortByArea)
+
+    return {"areas_journey": areas_journey, "area_usage": area_usage}
+
+
+def journey_ngram_counts(frames, n):
+    """Counts, per sequence of n areas, the customers whose journey contains it.
+
+    A journey is the customer's distinct non Free areas in first visit order.
+    The empty sequence counts every customer with a journey.
+    """
+    journeys = {}
+    visited = set()
+    for frame in frames:
+        if frame["area_type"] == "Free":
+            continue
+        visit = (frame["global_identity"], frame["area"], frame["area_type"])
+        if visit in visited:
+            continue
+        visited.add(visit)
+        journeys.setdefault(frame["global_identity"], []).append(frame["area"])
+
+    counts = Counter()
+    for journey in journeys.values():
+        counts[()] += 1
+        counts.update(
+            set(tuple(journey[i : i + n]) for i in range(len(journey) - n + 1))
+        )
+    return counts
+
+
+def encode_journey(journey):
+    return json.dumps(list(journey))
+
 
-    return epoch_interval_dict
+def decode_journey(journey_key):
+    return tuple(json.loads(journey_key))
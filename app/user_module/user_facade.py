@@ -1,7 +1,7 @@
 from flask import jsonify, abort, make_response
 from cassandra.cqlengine.query import BatchQuery
 from .user_models import UsersByLocation, User, UserStatus, WorkingHours, Language
-from app.center_module.center_models import Center
+from app.cache_module import metadata_cache
 import cassandra
 from app.utils import (
     gen_salt,
@@ -39,7 +39,7 @@ def _update_user_by_center(requester, user, old_user, image):
         or requester.get("role") == "general-manager"
     ):
         try:
-            new_center_exists = Center.objects(name=user_center).get()
+            new_center_exists = metadata_cache.get_center(user_center)
         except cassandra.cqlengine.query.DoesNotExist:
             abort(make_response(jsonify(error=CENTER_NOT_FOUND), 400))
 
@@ -109,7 +109,7 @@ class UserFacade:
             f"{user.get('hashed_pass')}{salt}".encode("utf-8")
         ).hexdigest()
         try:
-            center_exists = Center.objects(name=user.get("center_name")).get()
+            center_exists = metadata_cache.get_center(user.get("center_name"))
             if center_exists:
                 User.if_not_exists().create(
                     email=user.get("email"),
@@ -198,7 +198,7 @@ class UserFacade:
         try:
             user_requesting = dict(User.objects(email=requester_id).get())
             user_before_update = dict(User.objects(email=user.get("email")).get())
-            new_center_exists = Center.objects(name=user.get("center_name")).get()
+            new_center_exists = metadata_cache.get_center(user.get("center_name"))
             if new_center_exists and (
                 user_requesting.get("role") == "center-manager"
                 or user_requesting.get("role") == "general-manager"
@@ -252,7 +252,7 @@ class UserFacade:
         if center_name is None or email is None:
             abort(make_response(jsonify(error=NULL_PARAMS), 400))
         try:
-            center_exists = Center.objects(name=center_name).get()
+            center_exists = metadata_cache.get_center(center_name)
             if center_exists:
                 User.objects(email=email).if_exists().delete()
                 UsersByLocation.objects(
@@ -266,7 +266,7 @@ class UserFacade:
     @staticmethod
     def get_employees_from_center(center):
         try:
-            center_exists = Center.objects(name=center).get()
+            center_exists = metadata_cache.get_center(center)
             if center_exists:
                 query = UsersByLocation.objects(center_name=center).all()
                 employee_ids = [employee.email for employee in query]
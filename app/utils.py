@@ -4,7 +4,10 @@ import requests
 import json
 import re
 import base64
+import math
 import time
+import cv2
+import numpy as np
 
 
 authorized_roles = ["officer", "center-manager", "general-manager"]
@@ -19,6 +22,7 @@ EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
 BASE64_HEADER = "data:image/png;base64"
 DEFAULT_PAGE = 0
 DEFAULT_PAGE_SIZE = 10
+WINDOW_ALIGNMENTS = {"minute": 60, "hour": 60 * 60, "day": 60 * 60 * 24}
 
 # ** ERROR MESSAGES ** #
 EMPTY_REQUEST = "Empty request"
@@ -31,6 +35,10 @@ AREA_NOT_FOUND = "Area not found"
 CUSTOMER_NOT_FOUND = "Customer not found"
 USER_OR_PASSWORD_INCORRECT = "User or password incorrect"
 INVALID_PAGE_NUMBER = "Wrong page number"
+INVALID_CURSOR = "Wrong cursor"
+REPORT_JOB_NOT_FOUND = "Report job not found"
+REPORT_NOT_READY = "Report not ready"
+LIVE_FEED_FULL = "Too many live feeds open, retry later"
 
 # **  ** #
 
@@ -126,3 +134,59 @@ def create_area_mapper(areas):
         return area_map[area_name]
 
     return area_mapper
+
+
+def zone_raster(areas):
+    """Rasterizes the areas' polygons into a label image, in floor plan pixels.
+
+    Pixel [y, x] holds i + 1 for the first of the areas containing it and 0 when
+    none does. The image only spans up to the farthest polygon point.
+    """
+    polygons = [
+        (label, np.array(bytes2json(area.polygon), dtype=np.int32).reshape((-1, 2)))
+        for label, area in enumerate(areas, 1)
+    ]
+    polygons = [(label, polygon) for label, polygon in polygons if len(polygon) > 0]
+    if len(polygons) <= 0:
+        return np.zeros((0, 0), dtype=np.uint16)
+
+    width = max(polygon[:, 0].max() for label, polygon in polygons) + 1
+    height = max(polygon[:, 1].max() for label, polygon in polygons) + 1
+    labels = np.zeros((height, width), dtype=np.uint16)
+    # Drawn last to first so that overlaps keep the first area
+    for label, polygon in reversed(polygons):
+        cv2.fillPoly(labels, [polygon.reshape((-1, 1, 2))], label)
+    return labels
+
+
+def zone_labels(labels, x, y):
+    """Looks up the zone label of each (x, y) position, 0 outside every zone."""
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    inside = (x >= 0) & (y >= 0) & (x < labels.shape[1]) & (y < labels.shape[0])
+    found = np.zeros(len(x), dtype=np.uint16)
+    found[inside] = labels[y[inside], x[inside]]
+    return found
+
+
+def align_window(from_time, to_time, align):
+    """Widens a window to whole minutes, hours or days (UTC), both ends included.
+
+    Windows are returned as is without align, raises ValueError for unknown ones.
+    """
+    if align is None:
+        return from_time, to_time
+    if align not in WINDOW_ALIGNMENTS:
+        raise ValueError(f"Unknown alignment {align}")
+    step = WINDOW_ALIGNMENTS[align]
+    return (
+        math.floor(from_time) // step * step,
+        (math.floor(to_time) // step + 1) * step - 1,
+    )
+
+
+def window_headers(from_time, to_time, align):
+    """Reports the effective window of an aligned request."""
+    if align is None:
+        return {}
+    return {"X-Window-From": str(from_time), "X-Window-To": str(to_time)}
@@ -0,0 +1,86 @@
+"""Waiting time lookups of get_client_list against the number of customers.
+
+Compares one sequential cqlengine query per customer with the bounded
+concurrent read_dwell_times. Customer ids are taken from DwellTime and cycled
+to reach each occupancy, e.g. inside the testing container:
+
+    python -m benchmarks.client_list_benchmark --center Headquarters
+"""
+from app.center_module.center_models import Areas
+from app.timeline_module.timeline_models import DwellTime
+from app.timeline_module.timeline_reader import read_dwell_times
+from itertools import cycle, islice
+import argparse
+import timeit
+
+
+def sequential_dwell_times(center_name, global_identities, areas, from_time, to_time):
+    return {
+        global_identity: sum(
+            [
+                row.dwell_time
+                for row in DwellTime.objects(
+                    center_name=center_name,
+                    global_identity=global_identity,
+                    area__in=areas,
+                    epoch_second__gt=from_time,
+                    epoch_second__lt=to_time,
+                ).all()
+                if row.dwell_time is not None
+            ]
+        )
+        for global_identity in global_identities
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--center", default="Headquarters")
+    parser.add_argument("--from-time", type=int, default=0)
+    parser.add_argument("--to-time", type=int, default=2 ** 31)
+    parser.add_argument(
+        "--customers", type=int, nargs="+", default=[25, 50, 100, 200, 400]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    areas = [
+        area.area_name
+        for area in Areas.objects(center_name=args.center, area_type="Waiting").all()
+    ]
+    known_identities = sorted(
+        {row.global_identity for row in DwellTime.objects(center_name=args.center)}
+    )
+    if not known_identities:
+        parser.error(f"no DwellTime rows for {args.center}")
+
+    for customers in args.customers:
+        global_identities = list(islice(cycle(known_identities), customers))
+        lookup_args = (
+            args.center,
+            global_identities,
+            areas,
+            args.from_time,
+            args.to_time,
+        )
+        sequential_time = min(
+            timeit.repeat(
+                lambda: sequential_dwell_times(*lookup_args),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        concurrent_time = min(
+            timeit.repeat(
+                lambda: read_dwell_times(*lookup_args), number=1, repeat=args.repeat
+            )
+        )
+        print(
+            f"{customers:>6} customers   sequential {sequential_time * 1e3:>8.1f} ms   "
+            f"concurrent {concurrent_time * 1e3:>8.1f} ms   "
+            f"x{sequential_time / concurrent_time:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""In-memory aggregation cost of /timeline/history on synthetic frames.
+
+Compares the former per-row apply and per-interval mapper with the counts and
+pivot pipeline, and checks both build the same response. Only the aggregation
+is timed, the frames are generated in memory, e.g. inside the testing container:
+
+    python -m benchmarks.history_benchmark --rows 1000000
+"""
+from app.timeline_module.timeline_utils import (
+    age_values,
+    ethnicity_values,
+    gender_values,
+    history_columns,
+    history_counts,
+    history_frames,
+    history_records,
+)
+import argparse
+import json
+import numpy as np
+import pandas as pd
+import time
+
+
+def synthetic_frames(rows, from_time, to_time, seed=0):
+    random = np.random.RandomState(seed)
+    return pd.DataFrame(
+        {
+            "epoch_second": np.sort(random.randint(from_time, to_time, rows)),
+            "gender": random.choice(gender_values, rows),
+            "ethnicity": random.choice(ethnicity_values, rows),
+            "age": random.choice(age_values, rows),
+            "happiness": random.randint(0, 101, rows),
+        },
+        columns=history_columns,
+    )
+
+
+def legacy_mapper(epoch_interval, time_interval, df_gender, df_ethnicity, df_age):
+    epoch_interval_dict = {"time": int(epoch_interval * time_interval)}
+    for df_grouped, dimension, values in [
+        (df_gender, "gender", gender_values),
+        (df_ethnicity, "ethnicity", ethnicity_values),
+        (df_age, "age", age_values),
+    ]:
+        for index, row in df_grouped.iterrows():
+            epoch_interval_dict[row[dimension]] = round(row["happiness"])
+        for value in values:
+            if value not in epoch_interval_dict:
+                epoch_interval_dict[value] = 0
+
+    if epoch_interval_dict["Female"] == 0:
+        epoch_interval_dict["total_avg"] = epoch_interval_dict["Male"]
+    elif epoch_interval_dict["Male"] == 0:
+        epoch_interval_dict["total_avg"] = epoch_interval_dict["Female"]
+    else:
+        epoch_interval_dict["total_avg"] = (
+            epoch_interval_dict["Male"] + epoch_interval_dict["Female"]
+        ) / 2
+    return epoch_interval_dict
+
+
+def legacy_history(df_db, history_type, time_interval):
+    df_db = history_frames(df_db).copy()
+    df_db["epoch_second_interval"] = df_db.apply(
+        lambda row: int(row.epoch_second / time_interval), axis=1
+    )
+    list_epoch_interval = list(df_db["epoch_second_interval"].unique())
+    aggregation = "mean" if history_type == "happiness" else "count"
+    df_grouped = [
+        df_db[["epoch_second_interval", dimension, "happiness"]]
+        .groupby(["epoch_second_interval", dimension], as_index=False)
+        .agg(aggregation)
+        for dimension in ["gender", "ethnicity", "age"]
+    ]
+    return [
+        legacy_mapper(
+            epoch_interval,
+            time_interval,
+            *[
+                df.loc[df["epoch_second_interval"] == epoch_interval]
+                for df in df_grouped
+            ],
+        )
+        for epoch_interval in list_epoch_interval
+    ]
+
+
+def pipeline_history(df_db, history_type, time_interval):
+    df_counts = history_counts(history_frames(df_db), time_interval)
+    return history_records(df_counts, history_type, time_interval)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--time-interval", type=float, default=3600)
+    parser.add_argument("--history-type", default="happiness")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    from_time = 1586131200
+    df_db = synthetic_frames(args.rows, from_time, from_time + args.days * 86400)
+
+    records, pipeline_time = timed(
+        pipeline_history, df_db, args.history_type, args.time_interval
+    )
+    print(f"pipeline {pipeline_time:>8.2f} s   {len(records)} intervals")
+
+    if not args.skip_legacy:
+        legacy_records, legacy_time = timed(
+            legacy_history, df_db, args.history_type, args.time_interval
+        )
+        print(f"legacy   {legacy_time:>8.2f} s   x{legacy_time / pipeline_time:.1f}")
+        same = json.dumps(records, sort_keys=True) == json.dumps(
+            legacy_records, sort_keys=True
+        )
+        print(f"identical responses: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Per-call overhead of the prepared-statement repository against cqlengine.
+
+Runs against the database configured through DB_URI/DB_PORT, e.g. inside the
+testing container after populate-cassandra.sh:
+
+    python -m benchmarks.repository_benchmark --center Headquarters --customer C-0001
+"""
+from app.center_module.center_models import Center
+from app.timeline_module.timeline_models import Timeline, TimelineByCustomer
+from app.timeline_module.timeline_reader import read_timeline_window
+from app.persistence_module import repository
+import argparse
+import timeit
+
+
+def report(name, cqlengine_fn, repository_fn, calls):
+    cqlengine_time = min(timeit.repeat(cqlengine_fn, number=calls, repeat=3)) / calls
+    repository_time = min(timeit.repeat(repository_fn, number=calls, repeat=3)) / calls
+    print(
+        f"{name:<20} cqlengine {cqlengine_time * 1e6:>10.0f} us/call   "
+        f"repository {repository_time * 1e6:>10.0f} us/call   "
+        f"x{cqlengine_time / repository_time:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--center", default="Headquarters")
+    parser.add_argument("--customer", default="C-0001")
+    parser.add_argument("--from-time", type=int, default=1586131200)
+    parser.add_argument("--to-time", type=int, default=1586303999)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    report(
+        "center lookup",
+        lambda: Center.objects(name=args.center).get(),
+        lambda: repository.get_center(args.center),
+        args.calls,
+    )
+    report(
+        "customer timeline",
+        lambda: list(
+            TimelineByCustomer.objects(
+                center_name=args.center,
+                global_identity=args.customer,
+                epoch_second__gte=args.from_time,
+            ).all()
+        ),
+        lambda: repository.read_customer_timeline(
+            args.center, args.customer, args.from_time
+        ),
+        args.calls,
+    )
+    report(
+        "center window scan",
+        lambda: list(
+            Timeline.objects(
+                center_name=args.center,
+                epoch_second__gte=args.from_time,
+                epoch_second__lte=args.to_time,
+            ).all()
+        ),
+        lambda: list(read_timeline_window(args.center, args.from_time, args.to_time)),
+        max(args.calls // 10, 1),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,11 @@ do
 done
 
 ./populate-cassandra.sh tessandra
+docker exec -it cja-backend-testing flask timeline backfill-by-day
+docker exec -it cja-backend-testing flask timeline rollup-history --from-time 1586217600
+docker exec -it cja-backend-testing flask timeline tile-heatmaps --from-time 1586217600
+docker exec -it cja-backend-testing flask timeline sketch-attendance --from-time 1586217600
+docker exec -it cja-backend-testing flask timeline count-journeys --from-time 1586217600
 
 echo Running Tests for $(pwd)...
 docker exec -it cja-backend-testing pytest app